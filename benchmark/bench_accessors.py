@@ -0,0 +1,78 @@
+#!python
+# coding: utf-8
+
+"""Measure attr, attrs, attrdict and values pipes on wide records.
+
+The result of each pipe is compared with the implementation which checks
+every field by hasattr/getattr or membership test per data.
+
+Usage: python benchmark/bench_accessors.py [num_records] [num_fields]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cmdlet.cmds import *
+
+
+@pipe.func
+def attrs_per_field(prev, attr_names):
+    for obj in prev:
+        yield [getattr(obj, name) for name in attr_names if hasattr(obj, name)]
+
+
+@pipe.func
+def attrdict_per_field(prev, attr_names):
+    for obj in prev:
+        yield dict((name, getattr(obj, name)) for name in attr_names if hasattr(obj, name))
+
+
+@pipe.func
+def values_per_field(prev, *keys):
+    for d in prev:
+        yield [d[k] for k in keys if k in d]
+
+
+@pipe.func
+def index_values_per_field(prev, *keys):
+    for d in prev:
+        yield [d[i] for i in keys if 0 <= i < len(d)]
+
+
+def measure(cmd):
+    begin = time.perf_counter()
+    cmd.run()
+    return time.perf_counter() - begin
+
+
+def main():
+    num_records = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_fields = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    names = ['field%d' % i for i in range(num_fields)]
+    Record = type('Record', (object, ), dict((name, i) for i, name in enumerate(names)))
+    objs = [Record() for i in range(num_records)]
+    dicts = [dict((name, i) for i, name in enumerate(names)) for r in range(num_records)]
+    lists = [list(range(num_fields)) for r in range(num_records)]
+    indexes = list(range(num_fields))
+
+    cases = [
+        ('attrs', objs | attrs_per_field(names), objs | attrs(names)),
+        ('attrdict', objs | attrdict_per_field(names), objs | attrdict(names)),
+        ('values(dict)', dicts | values_per_field(*names), dicts | values(*names)),
+        ('values(list)', lists | index_values_per_field(*indexes), lists | values(*indexes)),
+    ]
+    print('%d records, %d fields' % (num_records, num_fields))
+    print('%-14s %12s %12s %8s' % ('pipe', 'per-field', 'getter', 'speedup'))
+    for name, baseline, cmd in cases:
+        assert baseline.result() == cmd.result()
+        t0 = measure(baseline)
+        t1 = measure(cmd)
+        print('%-14s %11.3fs %11.3fs %7.2fx' % (name, t0, t1, t0 / t1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!python
+# coding: utf-8
+
+"""Measure the throughput of a shared Pipe object iterated by many threads.
+
+The same module-level Pipe object is iterated concurrently by 1, 2, 4, ...
+threads. The total number of processed items per second is reported for each
+thread count. With a GIL build, throughput is expected to stay flat. With a
+free-threaded build (python3.13t or later), it should scale with cores.
+
+Usage: python benchmark/bench_threads.py [items_per_thread] [max_threads]
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cmdlet.cmds import *
+
+#: The pipe shared by all threads.
+shared = (pipe.filter(lambda x: x % 3 != 0) |
+          pipe.map(lambda x: {'id': x, 'value': x * 2}) |
+          values('value') |
+          flatten |
+          pipe.reduce(lambda x, accum: accum + x)(init=0))
+
+
+def run_threads(num_threads, num_items):
+    """Iterate the shared pipe by num_threads threads.
+
+    :returns: The seconds used.
+    """
+    barrier = threading.Barrier(num_threads + 1)
+
+    def worker():
+        barrier.wait()
+        (range(num_items) | shared).run()
+
+    threads = [threading.Thread(target=worker) for i in range(num_threads)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    begin = time.perf_counter()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - begin
+
+
+def main():
+    num_items = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 4)
+
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print('Python %s, GIL %s' % (sys.version.split()[0], 'enabled' if is_gil_enabled else 'disabled'))
+    print('%8s %12s %14s %8s' % ('threads', 'seconds', 'items/sec', 'scale'))
+
+    base = None
+    num_threads = 1
+    while num_threads <= max_threads:
+        seconds = run_threads(num_threads, num_items)
+        throughput = num_threads * num_items / seconds
+        base = base or throughput
+        print('%8d %12.3f %14.0f %8.2f' % (num_threads, seconds, throughput, throughput / base))
+        num_threads *= 2
+
+
+if __name__ == '__main__':
+    main()
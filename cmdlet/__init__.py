@@ -22,6 +22,7 @@ __docformat__ = "reStructuredText"
 
 __all__ = [
     'Pipe',
+    'CompiledPipe',
     'PipeFunction',
     'UnregisteredPipeType',
     'register_type',
@@ -29,5 +30,6 @@ __all__ = [
     'unregister_all_types',
     'has_registered_type',
     'get_item_creator',
+    'batches',
     'cmds',
 ]
@@ -0,0 +1,210 @@
+#!python
+# coding: utf-8
+
+"""This module provides the pool of forked worker processes which is shared
+by the parallel pipes of cmdlet.
+"""
+
+import collections
+import threading
+import pickle
+import marshal
+import struct
+import time
+
+def fork_context():
+    """Get the multiprocessing context of fork start method, or None if it is
+    not available on this platform.
+    """
+    import multiprocessing
+    try:
+        return multiprocessing.get_context('fork')
+    except (AttributeError, ValueError):
+        return None
+
+def send_frame(conn, obj, serializer='pickle'):
+    """Send obj to connection as frames. If serializer is 'marshal', obj is
+    sent by marshal if possible. Otherwise, it is pickled by protocol 5, and
+    the out-of-band buffers (e.g. numpy arrays) are sent as separated frames
+    without copying into the pickle stream.
+
+    :param conn: The connection object.
+    :param obj: The object to be sent.
+    :param serializer: 'pickle' or 'marshal'.
+    :type serializer: str
+    """
+    if serializer == 'marshal':
+        try:
+            conn.send_bytes(b'M' + marshal.dumps(obj))
+            return
+        except ValueError:
+            pass
+    buffers = []
+    if pickle.HIGHEST_PROTOCOL >= 5:
+        data = pickle.dumps(obj, 5, buffer_callback=buffers.append)
+    else:
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    conn.send_bytes(b'P' + struct.pack('<I', len(buffers)))
+    conn.send_bytes(data)
+    for buf in buffers:
+        conn.send_bytes(buf.raw())
+
+def recv_frame(conn):
+    """Receive an object sent by send_frame."""
+    header = conn.recv_bytes()
+    if header[:1] == b'M':
+        return marshal.loads(header[1:])
+    num, = struct.unpack('<I', header[1:])
+    data = conn.recv_bytes()
+    if num == 0:
+        return pickle.loads(data)
+    return pickle.loads(data, buffers=[conn.recv_bytes() for i in range(num)])
+
+def _worker_main(target, conn_in, conn_out, serializer):
+    """Main function of a worker process of ForkPool. The statistics of
+    worker are sent with the end mark.
+
+    :param target: The function which gets an iterator of input chunks and
+                   returns an iterable of output chunks.
+    :param conn_in: The connection to receive input chunks.
+    :param conn_out: The connection to send output chunks.
+    :param serializer: 'pickle' or 'marshal'.
+    """
+    stats = dict(chunks=0, items=0, seconds=0.0)
+    start = time.time()
+
+    def chunks():
+        while True:
+            wait = time.time()
+            chunk = recv_frame(conn_in)
+            stats['seconds'] -= time.time() - wait
+            if chunk is None:
+                return
+            stats['chunks'] += 1
+            stats['items'] += len(chunk)
+            yield chunk
+
+    try:
+        for chunk in target(chunks()):
+            send_frame(conn_out, ('data', chunk), serializer)
+        stats['seconds'] += time.time() - start
+        stats['items_per_second'] = stats['items'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+        send_frame(conn_out, ('done', stats))
+    except BaseException as e:
+        try:
+            send_frame(conn_out, ('error', e))
+        except Exception:
+            send_frame(conn_out, ('error', RuntimeError(repr(e))))
+    finally:
+        conn_out.close()
+
+
+class ForkPool(object):
+    """Worker processes which are forked with target function pre-bound, so
+    the pipe functions (lambdas and closures included) are never pickled.
+    Only the data chunks are serialized and transferred through pipes.
+
+    Input chunks are sent by a feeder thread and output chunks are received
+    by caller, so a slow consumer blocks the workers instead of deadlock.
+    After run, stats contains the statistics of each worker: number of
+    chunks and items, busy seconds and items_per_second.
+    """
+    def __init__(self, context, target, workers, serializer='pickle'):
+        if serializer not in ('pickle', 'marshal'):
+            raise ValueError('Unknown serializer: %s' % serializer)
+        self.serializer = serializer
+        self.stats = {}
+        self.procs = []
+        self.conns_in = []
+        self.conns_out = []
+        for i in range(workers):
+            in_recv, in_send = context.Pipe(False)
+            out_recv, out_send = context.Pipe(False)
+            proc = context.Process(target=_worker_main, args=(target, in_recv, out_send, serializer))
+            proc.daemon = True
+            proc.start()
+            in_recv.close()
+            out_send.close()
+            self.procs.append(proc)
+            self.conns_in.append(in_send)
+            self.conns_out.append(out_recv)
+
+    def feed(self, inputs, errors):
+        """Send (worker index, chunk) pairs of inputs to workers, then the end
+        mark to all workers. The exception of inputs is appended to errors.
+        """
+        try:
+            for index, chunk in inputs:
+                send_frame(self.conns_in[index], chunk, self.serializer)
+        except BaseException as e:
+            errors.append(e)
+        try:
+            for conn in self.conns_in:
+                send_frame(conn, None)
+        except (IOError, OSError):
+            pass
+
+    def run(self, inputs):
+        """Feed inputs to workers and yield (worker index, output chunk) pairs
+        in the order of arrival.
+
+        :param inputs: The iterable of (worker index, chunk) pairs.
+        :returns: generator
+        """
+        from multiprocessing.connection import wait
+        errors = []
+        feeder = threading.Thread(target=self.feed, args=(inputs, errors))
+        feeder.daemon = True
+        feeder.start()
+        try:
+            readers = list(self.conns_out)
+            while readers:
+                for conn in wait(readers):
+                    index = self.conns_out.index(conn)
+                    try:
+                        kind, value = recv_frame(conn)
+                    except EOFError:
+                        raise RuntimeError('Worker process exited unexpectedly.')
+                    if kind == 'data':
+                        yield index, value
+                    elif kind == 'error':
+                        raise value
+                    else:
+                        self.stats[index] = value
+                        readers.remove(conn)
+            feeder.join()
+            if errors:
+                raise errors[0]
+        finally:
+            for proc in self.procs:
+                if proc.is_alive():
+                    proc.terminate()
+            for conn in self.conns_in + self.conns_out:
+                conn.close()
+            for proc in self.procs:
+                proc.join()
+
+    def map(self, chunks, ordered=True):
+        """Send chunks to workers in turn and yield the output of each chunk.
+        The target function must yield an output for each input chunk.
+
+        :param chunks: The iterable of input chunks.
+        :param ordered: True to yield outputs in the order of chunks, or
+                        False in the order of arrival.
+        :returns: generator
+        """
+        workers = len(self.procs)
+        inputs = ((seq % workers, chunk) for seq, chunk in enumerate(chunks))
+        if not ordered:
+            for index, output in self.run(inputs):
+                yield output
+            return
+        # Each worker outputs in the order of its input, so the order of
+        # chunks is restored by taking outputs from workers in turn.
+        pending = [collections.deque() for i in range(workers)]
+        turn = 0
+        for index, output in self.run(inputs):
+            pending[index].append(output)
+            while pending[turn]:
+                yield pending[turn].popleft()
+                turn = (turn + 1) % workers
@@ -4,6 +4,10 @@
 """This module provides a pipe-like mechanism to cascade commands."""
 
 import copy
+import itertools
+import functools
+import collections
+from . import _pool
 
 class UnregisteredPipeType(Exception):
     """Exception for unknown data type when cascading pipes.
@@ -19,6 +23,11 @@ class Pipe(object):
     operator and uses it to cascade generator functions. A set of cascading pipe
     objects can then be invoked by Pipe.iter(), Pipe.run() and Pipe.result()
     method.
+
+    Cascading and invoking don't change the state of existing Pipe objects.
+    The '|' operator and __call__ work on clones, and each invocation creates
+    its own generators. Therefore, a Pipe object can be shared and iterated by
+    many threads at the same time without locking.
     """
 
     #: A dictionary to map data type and pipe creator.
@@ -61,12 +70,11 @@ class Pipe(object):
             next = item_creator(next)
 
         # Self-cloning here is used to avoid conflict when Pipe object
-        # is refered more than once.
+        # is refered more than once. The operand is cloned too, so neither
+        # operand is changed and a shared Pipe object can be cascaded by
+        # many threads at the same time.
         clone = self.clone()
-        if not next.chained:
-            clone.append(next)
-        else:
-            clone.append(next(*next.args, **next.kw))
+        clone.append(next.clone())
         return clone
 
     def __ror__(self, prev):
@@ -164,6 +172,160 @@ class Pipe(object):
         """
         return list(self.iter())
 
+    def compile(self):
+        """Compile the cascading pipe to a CompiledPipe object. The compiled
+        object can be applied to many input sources without cloning Pipe
+        objects.
+
+        :returns: The compiled pipe.
+        :rtype: CompiledPipe
+        """
+        return CompiledPipe(self)
+
+class CompiledPipe(object):
+    r"""CompiledPipe is a frozen form of cascading Pipe objects. The generator
+    functions and their arguments are captured when compiling, so later
+    changes of Pipe objects don't affect it. Binding a new input source to it
+    doesn't clone any Pipe object. It doesn't change its state when running,
+    so it is safe to be used by many threads at the same time.
+
+    For example:
+
+    extract_topic = (readline(end=10) | match(r'^topic:\s*(?P<topic>.+)', to=dict) | values('topic')).compile()
+    for filename in filenames:
+        topics = extract_topic.result([filename])
+    """
+    __slots__ = ('stages', )
+
+    def __init__(self, pipe):
+        """Constructor of CompiledPipe.
+
+        :param pipe: The head of cascading Pipe objects.
+        :type pipe: Pipe
+        """
+        stages = []
+        while pipe is not None:
+            stages.append((pipe.func, pipe.args, dict(pipe.kw)))
+            pipe = pipe.next
+        object.__setattr__(self, 'stages', tuple(stages))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompiledPipe object is read-only.')
+
+    def __call__(self, source=None):
+        """Bind input source and return an iterator.
+
+        :param source: The input source. It can be None, a Pipe object, an
+                       object whose type is registered or any iterable object.
+        :returns: A generator for iteration.
+        """
+        return self.iter(source)
+
+    def iter(self, source=None):
+        """Bind input source and return an iterator.
+
+        :param source: The input source. It can be None, a Pipe object, an
+                       object whose type is registered or any iterable object.
+        :returns: A generator for iteration.
+        """
+        if source is None or isinstance(source, Pipe):
+            generator = source.iter() if source is not None else None
+        else:
+            item_creator = get_item_creator(type(source))
+            if item_creator is not None:
+                generator = item_creator(source).iter()
+            elif hasattr(source, '__iter__'):
+                generator = iter(source)
+            else:
+                raise UnregisteredPipeType(type(source))
+        for func, args, kw in self.stages:
+            generator = func(generator, *args, **kw)
+        return generator
+
+    def run(self, source=None):
+        """Execute with input source and return the last processed data.
+
+        :param source: The input source.
+        :returns: The last processed data.
+        """
+        last_data = None
+        for last_data in self.iter(source):
+            pass
+        return last_data
+
+    def result(self, source=None):
+        """Execute with input source and return a list which contains all
+        processed data.
+
+        :param source: The input source.
+        :returns: The list of processed data.
+        :rtype: list
+        """
+        return list(self.iter(source))
+
+def batches(iterable, size):
+    """Split data of iterable into lists. Each list contains at most size
+    items.
+
+    :param iterable: The data source.
+    :param size: The maximum number of items in a list.
+    :type size: integer
+    :returns: generator of lists
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            break
+        yield batch
+
+def _reduce_chunk(func, chunk, init, argv, kw):
+    """Reduce a chunk of data from a copy of init."""
+    accum = copy.deepcopy(init)
+    for i in chunk:
+        accum = func(i, accum, *argv, **kw)
+    return accum
+
+def _tree_reduce(prev, func, combine, init, argv, kw, workers, chunk_size, processes):
+    """Reduce chunks of prev in parallel and combine the partial results in a
+    balanced tree. The partial results are kept in a stack like a binary
+    counter, so at most log2(number of chunks) of them are in memory.
+    """
+    if combine is None:
+        combine = lambda a, b: func(b, a, *argv, **kw)
+    reducer = functools.partial(_reduce_chunk, func, init=init, argv=argv, kw=kw)
+    context = _pool.fork_context() if processes else None
+
+    stack = []
+    def push(partial):
+        level = 0
+        while stack and stack[-1][0] == level:
+            partial = combine(stack.pop()[1], partial)
+            level += 1
+        stack.append((level, partial))
+
+    if context is not None:
+        target = lambda chunks: (reducer(chunk) for chunk in chunks)
+        for partial in _pool.ForkPool(context, target, workers).map(batches(prev, chunk_size)):
+            push(partial)
+    else:
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            pending = collections.deque()
+            for chunk in batches(prev, chunk_size):
+                pending.append(executor.submit(reducer, chunk))
+                if len(pending) >= workers * 2:
+                    push(pending.popleft().result())
+            while pending:
+                push(pending.popleft().result())
+
+    if not stack:
+        return init
+    accum = stack.pop()[1]
+    while stack:
+        accum = combine(stack.pop()[1], accum)
+    return accum
+
 def register_type(item_type, item_creator):
     """Register data type to Pipe class. Check :py:meth:`Pipe.__or__` and
     :py:meth:`Pipe.__ror__` for detail.
@@ -204,7 +366,7 @@ def get_item_creator(item_type):
     :returns: Creator function. None if type not found.
     """
     if item_type not in Pipe.pipe_item_types:
-        for registered_type in Pipe.pipe_item_types:
+        for registered_type in list(Pipe.pipe_item_types):
             if issubclass(item_type, registered_type):
                 return Pipe.pipe_item_types[registered_type]
         return None
@@ -267,7 +429,7 @@ class PipeFunction:
         return Pipe(wrapper)
 
     @staticmethod
-    def reduce(func):
+    def reduce(func, associative=False, combine=None, workers=None, chunk_size=4096, processes=False):
         """Wrap a reduce function to Pipe object. Reduce function is a function
         with at least two arguments. It works like built-in reduce function.
         It takes first argument for accumulated result, second argument for
@@ -278,23 +440,89 @@ class PipeFunction:
         The first argument passed into reducer function is the piped data. The
         second argument is the accumulated result. The return value of reducer 
         function should be the accumulated result.
-        
-        :param func: The filter function to be wrapped.
+
+        If associative is True and workers is specified, data are split into
+        chunks of chunk_size. Each chunk is reduced from a copy of *init* in
+        worker threads, or forked worker processes if processes is True. Then,
+        the partial results are combined in a balanced tree by
+        combine(earlier, later). The default combine is func(later, earlier),
+        which works when data and accumulated result have the same type, e.g.
+        sum. *init* must be the identity value of combine.
+
+        :param func: The reduce function to be wrapped.
         :type func: function object
-        :param args: The default arguments to be used for filter function.
-        :param kw: The default keyword arguments to be used for filter function.
+        :param associative: True if chunks can be reduced independently.
+        :type associative: bool
+        :param combine: The function to combine two partial results.
+        :type combine: function object
+        :param workers: The number of worker threads or processes.
+        :type workers: integer
+        :param chunk_size: The number of data in a chunk.
+        :type chunk_size: integer
+        :param processes: True to reduce chunks in forked worker processes.
+        :type processes: bool
         :returns: Pipe object
         """
         def wrapper(prev, *argv, **kw):
             accum = None if 'init' not in kw else kw.pop('init')
             if prev is None:
                 raise TypeError('A reducer must have input.')
+            if associative and workers:
+                yield _tree_reduce(prev, func, combine, accum, argv, kw, workers, chunk_size, processes)
+                return
             for i in prev:
                 accum = func(i, accum, *argv, **kw)
             yield accum
         return Pipe(wrapper)
 
 
+    @staticmethod
+    def batch_map(func, size=1024):
+        """Wrap a batch map function to Pipe object. Batch map function is a
+        function with at least one argument. The first argument is a list of
+        at most size data from previous pipe. It should return an iterable
+        object, and its items are sent to next generator one by one.
+
+        The function is called once per batch instead of once per data, so it
+        can use vectorized or bulk operations and the overhead of calling is
+        amortized.
+
+        :param func: The batch map function to be wrapped.
+        :type func: function object
+        :param size: The maximum number of data in a batch.
+        :type size: integer
+        :returns: Pipe object
+        """
+        def wrapper(prev, *argv, **kw):
+            if prev is None:
+                raise TypeError('A batch mapper must have input.')
+            for batch in batches(prev, size):
+                for i in func(batch, *argv, **kw):
+                    yield i
+        return Pipe(wrapper)
+
+    @staticmethod
+    def batch_filter(func, size=1024):
+        """Wrap a batch filter function to Pipe object. Batch filter function
+        is a function with at least one argument. The first argument is a list
+        of at most size data from previous pipe. It should return an iterable
+        of boolean values, one for each data in the list. The data is passed
+        if the corresponding value is true.
+
+        :param func: The batch filter function to be wrapped.
+        :type func: function object
+        :param size: The maximum number of data in a batch.
+        :type size: integer
+        :returns: Pipe object
+        """
+        def wrapper(prev, *argv, **kw):
+            if prev is None:
+                raise TypeError('A batch filter must have input.')
+            for batch in batches(prev, size):
+                for i in itertools.compress(batch, func(batch, *argv, **kw)):
+                    yield i
+        return Pipe(wrapper)
+
     @staticmethod
     def stopper(func):
         """Wrap a conditoinal function(stopper function) to Pipe object.
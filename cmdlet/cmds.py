@@ -15,8 +15,30 @@ import string
 import locale
 import codecs
 import functools
+import itertools
+import operator
+import heapq
+import tempfile
+import math
+import random
+import json
+import pickle
+import struct
+import hashlib
+import collections
+import threading
+import time
+import array
+import csv
 from six import PY3, StringIO, text_type, string_types
-from cmdlet import Pipe, PipeFunction, register_type, unregister_type
+from six.moves import queue
+from cmdlet import Pipe, PipeFunction, register_type, unregister_type, batches
+from cmdlet._pool import ForkPool, fork_context
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 #: Alias of cmdlet.PipeFuncion.
 pipe = PipeFunction
@@ -33,6 +55,23 @@ unicode_type = text_type
 #: Check if is string or unicode
 is_str_type = lambda x: isinstance(x, (string_type, unicode_type))
 
+#: Sentinel to detect the end of previous pipe.
+_empty = object()
+
+
+@functools.lru_cache(maxsize=None)
+def record_type(field_names):
+    """Get the record class for given field names. The record class is a
+    tuple-backed class made by collections.namedtuple, so it costs less
+    memory than a dict. Invalid field names are renamed to '_<index>'. The
+    same class is returned for the same field names.
+
+    :param field_names: The field names of record.
+    :type field_names: tuple
+    :returns: The record class.
+    """
+    return collections.namedtuple('Record', [str(name) for name in field_names], rename=True)
+
 
 def run(cmd):
     """Run pipe object and return its last result.
@@ -88,6 +127,119 @@ def items(prev, dict_obj):
         yield kv
 
 
+def _source_iter(source):
+    """Get iterator of source which is a Pipe object or iterable object."""
+    return source.iter() if isinstance(source, Pipe) else iter(source)
+
+
+def _prefetch(iterable, size, chunk=256):
+    """Iterate iterable in a background thread. Items are passed to caller by
+    chunks through a bounded queue. The exception raised in thread is raised
+    again in caller.
+
+    :param iterable: The iterable object to be read.
+    :param size: The maximum number of chunks in queue.
+    :type size: integer
+    :param chunk: The number of items in a chunk.
+    :type chunk: integer
+    :returns: generator
+    """
+    q = queue.Queue(size)
+    stop = threading.Event()
+
+    def put(obj):
+        while not stop.is_set():
+            try:
+                q.put(obj, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            for items in batches(iterable, chunk):
+                if not put((None, items)):
+                    return
+            put((None, None))
+        except BaseException as e:
+            put((e, None))
+
+    thread = threading.Thread(target=reader)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            error, items = q.get()
+            if error is not None:
+                raise error
+            if items is None:
+                break
+            for item in items:
+                yield item
+    finally:
+        stop.set()
+
+
+@pipe.func
+def merge(prev, *sources, **kw):
+    """merge pipe merges data from multiple sorted sources lazily by a heap.
+    Each source is a Pipe object or iterable object, and must be sorted by
+    the same key and order. The data from previous pipe is ignored.
+
+    For example:
+
+    merge(readline('web1.log'), readline('web2.log'), key=lambda line: line[:19]) | stdout
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param sources: The sorted sources to be merged.
+    :type sources: Pipe|iterable
+    :param key: The function to get comparison key. None means the data itself.
+    :type key: function object
+    :param reverse: True if the sources are sorted in descending order.
+    :type reverse: bool
+    :param prefetch: The number of chunks to prefetch for each source in its own thread. 0 means no thread.
+    :type prefetch: integer
+    :returns: generator
+    """
+    key = kw.pop('key', None)
+    reverse = kw.pop('reverse', False)
+    prefetch = kw.pop('prefetch', 0)
+    if kw:
+        raise TypeError('Unexpected keyword arguments: %s' % ', '.join(kw))
+
+    iters = [_source_iter(source) for source in sources]
+    if prefetch:
+        iters = [_prefetch(it, prefetch) for it in iters]
+    if key is None and not reverse:
+        merged = heapq.merge(*iters)
+    else:
+        merged = heapq.merge(*iters, key=key, reverse=reverse)
+    for data in merged:
+        yield data
+
+
+def _tuple_getter(getter_type, keys):
+    """Make a function which returns a tuple of values of keys from an object.
+
+    :param getter_type: operator.attrgetter or operator.itemgetter.
+    :param keys: The attribute names or item keys.
+    :type keys: tuple
+    :returns: function object
+    """
+    if len(keys) == 0:
+        return lambda obj: ()
+    if getter_type is operator.attrgetter and any('.' in k for k in keys):
+        # attrgetter follows dotted names, but getattr treats them as plain
+        # (and normally missing) attribute names.
+        return lambda obj: tuple(getattr(obj, k) for k in keys)
+    getter = getter_type(*keys)
+    if len(keys) == 1:
+        return lambda obj: (getter(obj), )
+    return getter
+
+
 @pipe.func
 def attr(prev, attr_name):
     """attr pipe can extract attribute value of object.
@@ -98,9 +250,16 @@ def attr(prev, attr_name):
     :type attr_name: str
     :returns: generator
     """
+    if '.' in attr_name:
+        getter = lambda obj: getattr(obj, attr_name)
+    else:
+        getter = operator.attrgetter(attr_name)
     for obj in prev:
-        if hasattr(obj, attr_name):
-            yield getattr(obj, attr_name)
+        try:
+            value = getter(obj)
+        except AttributeError:
+            continue
+        yield value
 
 
 @pipe.func
@@ -116,16 +275,18 @@ def attrs(prev, attr_names):
     :type attr_names: str of list
     :returns: generator
     """
+    names = tuple(attr_names)
+    getter = _tuple_getter(operator.attrgetter, names)
     for obj in prev:
-        attr_values = []
-        for name in attr_names:
-            if hasattr(obj, name):
-                attr_values.append(getattr(obj, name))
+        try:
+            attr_values = list(getter(obj))
+        except AttributeError:
+            attr_values = [getattr(obj, name) for name in names if hasattr(obj, name)]
         yield attr_values
 
 
 @pipe.func
-def attrdict(prev, attr_names):
+def attrdict(prev, attr_names, to=dict):
     """attrdict pipe can extract attribute values of object into a dict.
 
     The argument attr_names can be a list or a dict.
@@ -136,54 +297,95 @@ def attrdict(prev, attr_names):
     If attr_names is dict and the key doesn't exist in prev's object.
     the value of corresponding attr_names key will be copy to yielded dict.
 
+    If 'to' is 'record', yield a record whose fields are attr_names instead of
+    a dict. Check record_type() for detail. A missing attribute is None, or
+    the value in attr_names if it is a dict.
+
     :param prev: The previous iterator of pipe.
     :type prev: Pipe
     :param attr_names: The list or dict of attribute names
     :type attr_names: str of list or dict
+    :param to: dict or 'record'.
+    :type to: type|str
     :returns: generator
     """
-    if isinstance(attr_names, dict):
+    names = tuple(attr_names)
+    getter = _tuple_getter(operator.attrgetter, names)
+    if to == 'record':
+        make_record = record_type(names)._make
+        defaults = attr_names if isinstance(attr_names, dict) else dict.fromkeys(names)
         for obj in prev:
-            attr_values = dict()
-            for name in attr_names.keys():
-                if hasattr(obj, name):
-                    attr_values[name] = getattr(obj, name)
-                else:
-                    attr_values[name] = attr_names[name]
+            try:
+                attr_values = getter(obj)
+            except AttributeError:
+                attr_values = [getattr(obj, name, defaults[name]) for name in names]
+            yield make_record(attr_values)
+    elif isinstance(attr_names, dict):
+        for obj in prev:
+            try:
+                attr_values = dict(zip(names, getter(obj)))
+            except AttributeError:
+                attr_values = dict((name, getattr(obj, name, attr_names[name])) for name in names)
             yield attr_values
     else:
         for obj in prev:
-            attr_values = dict()
-            for name in attr_names:
-                if hasattr(obj, name):
-                    attr_values[name] = getattr(obj, name)
+            try:
+                attr_values = dict(zip(names, getter(obj)))
+            except AttributeError:
+                attr_values = dict((name, getattr(obj, name)) for name in names if hasattr(obj, name))
             yield attr_values
 
 
 @pipe.func
-def flatten(prev, depth=sys.maxsize):
+def flatten(prev, depth=sys.maxsize, atomic=()):
     """flatten pipe extracts nested item from previous pipe.
 
+    The nested items are extracted with an explicit stack, so the depth of
+    nesting is not limited by recursion limit.
+
     :param prev: The previous iterator of pipe.
     :type prev: Pipe
     :param depth: The deepest nested level to be extracted. 0 means no extraction.
     :type depth: integer
+    :param atomic: The extra iterable types which are not extracted, e.g. dict
+                   to keep dicts. str, bytes and bytearray are never extracted.
+    :type atomic: tuple of types
     :returns: generator
     """
-    def inner_flatten(iterable, curr_level, max_levels):
-        for i in iterable:
-            if hasattr(i, '__iter__') and curr_level < max_levels:
-                for j in inner_flatten(i, curr_level + 1, max_levels):
-                    yield j
-            else:
-                yield i
+    atomic = (str, bytes, bytearray) + tuple(atomic)
+
+    def is_nested(i):
+        return hasattr(i, '__iter__') and not isinstance(i, atomic)
+
+    if depth <= 0:
+        for d in prev:
+            yield d
+        return
+
+    if depth == 1:
+        for i in itertools.chain.from_iterable(d if is_nested(d) else (d, ) for d in prev):
+            yield i
+        return
 
     for d in prev:
-        if hasattr(d, '__iter__') and depth > 0:
-            for inner_d in inner_flatten(d, 1, depth):
-                yield inner_d
-        else:
+        if not is_nested(d):
             yield d
+            continue
+        # The iterators of outer levels are kept in stack. top is the
+        # iterator of current level, which is at level len(stack) + 1.
+        stack = []
+        top = iter(d)
+        while True:
+            for i in top:
+                if hasattr(i, '__iter__') and len(stack) + 1 < depth and not isinstance(i, atomic):
+                    stack.append(top)
+                    top = iter(i)
+                    break
+                yield i
+            else:
+                if not stack:
+                    break
+                top = stack.pop()
 
 
 @pipe.func
@@ -194,19 +396,51 @@ def values(prev, *keys, **kw):
     the key of dictionary which you want to get. If previous pipe send list or
     tuple,
 
+    By default, a list of values is yielded and missing keys are excluded. If
+    'to' in keyword argument is 'record', yield a record whose fields are keys
+    and missing values are None. Check record_type() for detail.
+
     :param prev: The previous iterator of pipe.
     :type prev: Pipe
+    :param to: list or 'record'.
+    :type to: type|str
     :returns: generator
     """
-    d = next(prev)
+    to = kw.pop('to', list)
+    d = next(prev, _empty)
+    if d is _empty:
+        return
     if isinstance(d, dict):
-        yield [d[k] for k in keys if k in d]
-        for d in prev:
-            yield [d[k] for k in keys if k in d]
+        if to == 'record':
+            get_values = lambda d: [d.get(k) for k in keys]
+        else:
+            get_values = lambda d: [d[k] for k in keys if k in d]
+        # Subclasses like defaultdict may not raise KeyError for missing keys,
+        # so only the data of exact dict type use itemgetter.
+        fast_getter = _tuple_getter(operator.itemgetter, keys)
+        fast_type = dict
+        missing_error = KeyError
     else:
-        yield [d[i] for i in keys if 0 <= i < len(d)]
-        for d in prev:
-            yield [d[i] for i in keys if 0 <= i < len(d)]
+        if to == 'record':
+            get_values = lambda d: [d[i] if 0 <= i < len(d) else None for i in keys]
+        else:
+            get_values = lambda d: [d[i] for i in keys if 0 <= i < len(d)]
+        # Negative indexes are excluded, so they can't use itemgetter.
+        is_index = all(isinstance(i, int) and i >= 0 for i in keys)
+        fast_getter = _tuple_getter(operator.itemgetter, keys) if is_index else None
+        fast_type = None
+        missing_error = IndexError
+    make = record_type(keys)._make if to == 'record' else list
+
+    for d in itertools.chain((d, ), prev):
+        if fast_getter is None or (fast_type is not None and type(d) is not fast_type):
+            yield make(get_values(d))
+            continue
+        try:
+            value_list = fast_getter(d)
+        except missing_error:
+            value_list = get_values(d)
+        yield make(value_list)
 
 @pipe.func
 def counter(prev):
@@ -286,6 +520,1190 @@ def pack(prev, n, rest=False, **kw):
         yield items
 
 
+def _dump_run(items, chunk=1024):
+    """Pickle items into a temporary file in chunks.
+
+    :param items: The list of items.
+    :type items: list
+    :returns: The temporary file object.
+    """
+    fd = tempfile.TemporaryFile()
+    for i in range(0, len(items), chunk):
+        pickle.dump(items[i:i + chunk], fd, pickle.HIGHEST_PROTOCOL)
+    fd.seek(0)
+    return fd
+
+
+def _load_run(fd):
+    """Load the items which are dumped by _dump_run.
+
+    :param fd: The file object.
+    :returns: generator
+    """
+    while True:
+        try:
+            items = pickle.load(fd)
+        except EOFError:
+            break
+        for item in items:
+            yield item
+
+
+@pipe.func
+def sort(prev, key=None, reverse=False, memory_limit=64 * 1024 * 1024):
+    """sort pipe sorts data from previous pipe. The data are kept in memory
+    until their size exceeds memory_limit. Then, they are sorted and spilled
+    to a temporary file as a run. At last, all runs are merged by
+    heapq.merge. The sort is stable. The data must be picklable if the
+    runs are spilled.
+
+    The size of data is estimated by sys.getsizeof, which doesn't count
+    referenced objects. Set memory_limit smaller for nested data.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param key: The function to extract comparison key.
+    :type key: function object
+    :param reverse: If true, sort in descending order.
+    :type reverse: bool
+    :param memory_limit: The estimated bytes of data to be kept in memory.
+    :type memory_limit: integer
+    :returns: generator
+    """
+    runs = []
+    try:
+        items = []
+        size = 0
+        for data in prev:
+            items.append(data)
+            size += sys.getsizeof(data)
+            if size > memory_limit:
+                items.sort(key=key, reverse=reverse)
+                runs.append(_dump_run(items))
+                items = []
+                size = 0
+        items.sort(key=key, reverse=reverse)
+
+        if not runs:
+            for data in items:
+                yield data
+            return
+        for data in heapq.merge(*([_load_run(fd) for fd in runs] + [items]), key=key, reverse=reverse):
+            yield data
+    finally:
+        for fd in runs:
+            fd.close()
+
+
+def _update_min(state, value):
+    return value if state is None or value < state else state
+
+def _update_max(state, value):
+    return value if state is None or value > state else state
+
+def _merge_min(state, other):
+    return state if other is None else _update_min(state, other)
+
+def _merge_max(state, other):
+    return state if other is None else _update_max(state, other)
+
+def _update_mean(state, value):
+    state[0] += value
+    state[1] += 1
+    return state
+
+def _merge_mean(state, other):
+    state[0] += other[0]
+    state[1] += other[1]
+    return state
+
+def _update_collect(state, value):
+    state.append(value)
+    return state
+
+def _merge_collect(state, other):
+    state.extend(other)
+    return state
+
+#: Aggregate functions of groupby pipe. Each of them is a tuple of
+#: (init, update, merge, final) functions.
+aggregators = {
+    'count': (lambda: 0, lambda s, v: s + 1, operator.add, None),
+    'sum': (lambda: 0, operator.add, operator.add, None),
+    'min': (lambda: None, _update_min, _merge_min, None),
+    'max': (lambda: None, _update_max, _merge_max, None),
+    'mean': (lambda: [0, 0], _update_mean, _merge_mean, lambda s: s[0] / s[1]),
+    'collect': (list, _update_collect, _merge_collect, None),
+}
+
+@pipe.func
+def groupby(prev, key, agg='count', value=None, max_keys=None, partitions=16):
+    """groupby pipe groups data from previous pipe by key(data) and computes
+    aggregates of each group in a hash table. For each group, a tuple of
+    (key, aggregate) is sent to next pipe after the last data.
+
+    The available aggregates are listed in cmds.aggregators: count, sum,
+    min, max, mean and collect. If agg is a list, the aggregate in yielded
+    tuple is a tuple of aggregates.
+
+    If max_keys is specified and the number of keys in hash table exceeds
+    it, the states of groups are spilled to temporary files, which are
+    partitioned by the hash of key. The partitions are merged one by one
+    after the last data, so only about 1/partitions of groups are in memory
+    at the same time. The keys and states must be picklable in this case.
+
+    For example:
+
+    bytes_per_host = readline('access.log') | resplit(r'\\s+') | groupby(lambda f: f[0], 'sum', value=lambda f: int(f[9]))
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param key: The function to get group key from data.
+    :type key: function object
+    :param agg: The name or list of names of aggregate.
+    :type agg: str|list
+    :param value: The function to get value to be aggregated from data. None means data itself.
+    :type value: function object
+    :param max_keys: The maximum number of groups in memory. None means no limit.
+    :type max_keys: integer
+    :param partitions: The number of partitions of spilled groups.
+    :type partitions: integer
+    :returns: generator
+    """
+    agg_names = [agg, ] if is_str_type(agg) else list(agg)
+    funcs = [aggregators[name] for name in agg_names]
+    inits = [f[0] for f in funcs]
+    updates = list(enumerate(f[1] for f in funcs))
+    merges = list(enumerate(f[2] for f in funcs))
+
+    def final(states):
+        results = tuple(states[i] if f[3] is None else f[3](states[i]) for i, f in enumerate(funcs))
+        return results[0] if is_str_type(agg) else results
+
+    table = {}
+    spill_files = []
+    for data in prev:
+        k = key(data)
+        v = data if value is None else value(data)
+        states = table.get(k)
+        if states is None:
+            states = table[k] = [init() for init in inits]
+        for i, update in updates:
+            states[i] = update(states[i], v)
+        if max_keys is not None and len(table) > max_keys:
+            if not spill_files:
+                spill_files = [tempfile.TemporaryFile() for i in range(partitions)]
+            parts = [[] for i in range(partitions)]
+            for item in table.items():
+                parts[hash(item[0]) % partitions].append(item)
+            for fd, part in zip(spill_files, parts):
+                pickle.dump(part, fd, pickle.HIGHEST_PROTOCOL)
+            table = {}
+
+    if not spill_files:
+        for k, states in table.items():
+            yield k, final(states)
+        return
+
+    try:
+        for p, fd in enumerate(spill_files):
+            part_table = {}
+            for k, states in table.items():
+                if hash(k) % partitions == p:
+                    part_table[k] = states
+            fd.seek(0)
+            while True:
+                try:
+                    part = pickle.load(fd)
+                except EOFError:
+                    break
+                for k, other in part:
+                    states = part_table.get(k)
+                    if states is None:
+                        part_table[k] = other
+                        continue
+                    for i, merge in merges:
+                        states[i] = merge(states[i], other[i])
+            for k, states in part_table.items():
+                yield k, final(states)
+    finally:
+        for fd in spill_files:
+            fd.close()
+
+
+def _hash_bytes(item):
+    """Convert item to bytes for hashing. The result is the same across
+    processes for str, bytes and objects with stable repr(). Equal numbers
+    (e.g. 1, 1.0 and True) and tuples or frozensets of equal items are
+    converted to the same bytes, so they are treated as equal like a set.
+    """
+    if isinstance(item, bytes):
+        return b'b' + item
+    if is_str_type(item):
+        return b's' + item.encode('utf-8')
+    if isinstance(item, complex) and item.imag == 0:
+        item = item.real
+    if isinstance(item, float) and item.is_integer():
+        item = int(item)
+    if isinstance(item, int):
+        return b'i' + str(int(item)).encode('utf-8')
+    if isinstance(item, tuple):
+        parts = [_hash_bytes(i) for i in item]
+    elif isinstance(item, frozenset):
+        parts = sorted(_hash_bytes(i) for i in item)
+    else:
+        return b'r' + repr(item).encode('utf-8')
+    # Each part is prefixed by its length, so the encoding is unambiguous.
+    body = b''.join(struct.pack('<I', len(part)) + part for part in parts)
+    return (b't' if isinstance(item, tuple) else b'f') + body
+
+def hash128(item):
+    """Calculate a 128-bit hash of item which is stable across processes.
+
+    :param item: The item to be hashed.
+    :returns: tuple of two 64-bit integers.
+    """
+    digest = hashlib.blake2b(_hash_bytes(item), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+class BloomFilter(object):
+    """Bloom filter is a compact bit array to test whether an item has been
+    added. It may report false positives at the configured rate, but never
+    false negatives.
+    """
+    def __init__(self, capacity, error_rate=0.001):
+        """Constructor of BloomFilter.
+
+        :param capacity: The expected number of items.
+        :type capacity: integer
+        :param error_rate: The false positive rate when capacity items are added.
+        :type error_rate: float
+        """
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / float(capacity) * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def add(self, item):
+        """Add item to filter.
+
+        :param item: The item to be added.
+        :returns: True if item might have been added before.
+        :rtype: bool
+        """
+        h1, h2 = hash128(item)
+        bits = self.bits
+        found = True
+        for i in range(self.num_hashes):
+            n = (h1 + i * h2) % self.num_bits
+            mask = 1 << (n & 7)
+            if not bits[n >> 3] & mask:
+                found = False
+                bits[n >> 3] |= mask
+        return found
+
+    def __contains__(self, item):
+        h1, h2 = hash128(item)
+        for i in range(self.num_hashes):
+            n = (h1 + i * h2) % self.num_bits
+            if not self.bits[n >> 3] & (1 << (n & 7)):
+                return False
+        return True
+
+    def merge(self, other):
+        """Merge another filter with the same size into this one.
+
+        :param other: The filter to be merged.
+        :type other: BloomFilter
+        """
+        if other.num_bits != self.num_bits or other.num_hashes != self.num_hashes:
+            raise ValueError('Cannot merge Bloom filters of different sizes.')
+        self.bits = bytearray(a | b for a, b in zip(self.bits, other.bits))
+
+@pipe.func
+def uniq(prev, key=None, mode='exact', capacity=1000000, error_rate=0.001):
+    """uniq pipe drops duplicated data from previous pipe. The first one of
+    duplicated data is passed.
+
+    The mode determines how the seen keys are remembered:
+    - 'exact': All keys are kept in a set. Its memory grows with the number of distinct keys.
+    - 'lru': At most capacity recent keys are kept. A duplicate is dropped only if its
+        key is among them. It is suitable for nearly-sorted data.
+    - 'bloom': Keys are added to a Bloom filter sized for capacity keys. Memory is
+        fixed, but a new key is dropped as duplicated at about error_rate.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param key: The function to get key from data. None means data itself.
+    :type key: function object
+    :param mode: 'exact', 'lru' or 'bloom'.
+    :type mode: str
+    :param capacity: The number of keys for 'lru' and 'bloom' mode.
+    :type capacity: integer
+    :param error_rate: The false positive rate for 'bloom' mode.
+    :type error_rate: float
+    :returns: generator
+    """
+    if mode == 'exact':
+        seen = set()
+        for data in prev:
+            k = data if key is None else key(data)
+            if k not in seen:
+                seen.add(k)
+                yield data
+    elif mode == 'lru':
+        seen = collections.OrderedDict()
+        for data in prev:
+            k = data if key is None else key(data)
+            if k in seen:
+                seen.move_to_end(k)
+                continue
+            seen[k] = None
+            if len(seen) > capacity:
+                seen.popitem(last=False)
+            yield data
+    elif mode == 'bloom':
+        seen = BloomFilter(capacity, error_rate)
+        for data in prev:
+            if not seen.add(data if key is None else key(data)):
+                yield data
+    else:
+        raise ValueError('Unknown mode of uniq: %s' % mode)
+
+
+class HyperLogLog(object):
+    """HyperLogLog sketch estimates the number of distinct items in fixed
+    memory. Its standard error is about 1.04 / sqrt(2 ** precision).
+    """
+    def __init__(self, precision=14):
+        """Constructor of HyperLogLog.
+
+        :param precision: The number of bits for register index. It uses 2 ** precision bytes.
+        :type precision: integer
+        """
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, item):
+        """Add item to sketch.
+
+        :param item: The item to be added.
+        """
+        h = hash128(item)[0]
+        rest_bits = 64 - self.precision
+        index = h >> rest_bits
+        rank = rest_bits - (h & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Merge another sketch with the same precision into this one.
+
+        :param other: The sketch to be merged.
+        :type other: HyperLogLog
+        """
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog sketches of different precisions.')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def cardinality(self):
+        """Estimate the number of distinct items.
+
+        :returns: The estimated number.
+        :rtype: integer
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / float(zeros))
+        return int(round(estimate))
+
+
+class KLLSketch(object):
+    """KLL sketch estimates quantiles of a stream in O(k) memory. It keeps a
+    hierarchy of compactors, each item in level h stands for 2 ** h items.
+    When a level is full, it is sorted and every other item is promoted to
+    next level.
+    """
+    def __init__(self, k=200, seed=None):
+        """Constructor of KLLSketch.
+
+        :param k: The capacity of top level. Larger k is more accurate.
+        :type k: integer
+        :param seed: The seed of random generator which used in compaction.
+        """
+        self.k = k
+        self.count = 0
+        self.compactors = []
+        self.max_size = 0
+        self.size = 0
+        self.random = random.Random(seed)
+        self._grow()
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * ((2.0 / 3) ** depth))) + 1
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _compress(self):
+        for level, compactor in enumerate(self.compactors):
+            if len(compactor) >= self._capacity(level):
+                if level + 1 >= len(self.compactors):
+                    self._grow()
+                compactor.sort()
+                kept = [compactor.pop()] if len(compactor) % 2 else []
+                self.compactors[level + 1].extend(compactor[self.random.randint(0, 1)::2])
+                self.compactors[level] = kept
+                break
+        self.size = sum(len(c) for c in self.compactors)
+
+    def add(self, item):
+        """Add item to sketch.
+
+        :param item: The comparable item to be added.
+        """
+        self.compactors[0].append(item)
+        self.count += 1
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def merge(self, other):
+        """Merge another sketch into this one.
+
+        :param other: The sketch to be merged.
+        :type other: KLLSketch
+        """
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.count += other.count
+        self.size = sum(len(c) for c in self.compactors)
+        while self.size >= self.max_size:
+            self._compress()
+
+    def quantiles(self, qs):
+        """Estimate quantiles.
+
+        :param qs: The list of quantiles between 0 and 1.
+        :type qs: list of float
+        :returns: The list of estimated values. None if the sketch is empty.
+        """
+        weighted = sorted((item, 1 << level) for level, compactor in enumerate(self.compactors) for item in compactor)
+        total = sum(w for item, w in weighted)
+        results = []
+        for q in qs:
+            value = None
+            accum = 0
+            for item, w in weighted:
+                accum += w
+                value = item
+                if accum >= q * total:
+                    break
+            results.append(value)
+        return results
+
+
+class SpaceSaving(object):
+    """SpaceSaving sketch finds the most frequent items with at most capacity
+    counters. The count of an item is overestimated by at most its error.
+    """
+    def __init__(self, capacity=1000):
+        """Constructor of SpaceSaving.
+
+        :param capacity: The number of counters.
+        :type capacity: integer
+        """
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        # Heap of (count, sequence, item). An entry is stale if the count of
+        # item has been increased. It is fixed when it is popped.
+        self.heap = []
+        self.sequence = itertools.count()
+
+    def _push(self, item):
+        heapq.heappush(self.heap, (self.counts[item], next(self.sequence), item))
+
+    def _pop_min(self):
+        while True:
+            count, seq, item = heapq.heappop(self.heap)
+            if self.counts[item] == count:
+                return item, count
+            self._push(item)
+
+    def add(self, item, weight=1):
+        """Add item to sketch.
+
+        :param item: The hashable item to be added.
+        :param weight: The weight of item.
+        """
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0
+            self._push(item)
+        else:
+            min_item, min_count = self._pop_min()
+            del self.counts[min_item]
+            del self.errors[min_item]
+            self.counts[item] = min_count + weight
+            self.errors[item] = min_count
+            self._push(item)
+
+    def merge(self, other):
+        """Merge another sketch into this one.
+
+        :param other: The sketch to be merged.
+        :type other: SpaceSaving
+        """
+        for item, count in other.counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+            self.errors[item] = self.errors.get(item, 0) + other.errors[item]
+        kept = sorted(self.counts, key=self.counts.get, reverse=True)[:self.capacity]
+        self.counts = dict((item, self.counts[item]) for item in kept)
+        self.errors = dict((item, self.errors[item]) for item in kept)
+        self.heap = []
+        for item in kept:
+            self._push(item)
+
+    def top(self, n=None):
+        """Get the most frequent items.
+
+        :param n: The number of items. None means all counted items.
+        :type n: integer
+        :returns: list of (item, count) in descending order of count.
+        """
+        return sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+@pipe.func
+def approx_distinct(prev, key=None, precision=14, sketch=False):
+    """approx_distinct pipe estimates the number of distinct data from
+    previous pipe by HyperLogLog. The estimate is sent to next pipe after the
+    last data.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param key: The function to get key from data. None means data itself.
+    :type key: function object
+    :param precision: The precision of HyperLogLog.
+    :type precision: integer
+    :param sketch: If true, send the HyperLogLog object instead of the estimate,
+                   so it can be merged with sketches of other partitions.
+    :type sketch: bool
+    :returns: generator
+    """
+    hll = HyperLogLog(precision)
+    for data in prev:
+        hll.add(data if key is None else key(data))
+    yield hll if sketch else hll.cardinality()
+
+@pipe.func
+def approx_quantiles(prev, qs=(0.5, 0.9, 0.99), value=None, k=200, seed=None, sketch=False):
+    """approx_quantiles pipe estimates quantiles of data from previous pipe by
+    KLL sketch. The list of estimated values is sent to next pipe after the
+    last data.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param qs: The quantiles between 0 and 1.
+    :type qs: list of float
+    :param value: The function to get value from data. None means data itself.
+    :type value: function object
+    :param k: The accuracy parameter of KLL sketch.
+    :type k: integer
+    :param seed: The seed of random generator.
+    :param sketch: If true, send the KLLSketch object instead of the estimates.
+    :type sketch: bool
+    :returns: generator
+    """
+    kll = KLLSketch(k, seed)
+    for data in prev:
+        kll.add(data if value is None else value(data))
+    yield kll if sketch else kll.quantiles(qs)
+
+@pipe.func
+def heavy_hitters(prev, n=10, key=None, capacity=1000, sketch=False):
+    """heavy_hitters pipe finds the most frequent data from previous pipe by
+    SpaceSaving sketch. A list of (key, count) of the n most frequent keys is
+    sent to next pipe after the last data.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param n: The number of most frequent keys.
+    :type n: integer
+    :param key: The function to get key from data. None means data itself.
+    :type key: function object
+    :param capacity: The number of counters. It should be much larger than n.
+    :type capacity: integer
+    :param sketch: If true, send the SpaceSaving object instead of the list.
+    :type sketch: bool
+    :returns: generator
+    """
+    space_saving = SpaceSaving(capacity)
+    for data in prev:
+        space_saving.add(data if key is None else key(data))
+    yield space_saving if sketch else space_saving.top(n)
+
+
+@pipe.func
+def topk(prev, k, key=None, smallest=False):
+    """topk pipe finds the k largest data from previous pipe with a bounded
+    heap. It takes O(n log k) time and O(k) memory. A sorted list of them is
+    sent to next pipe after the last data.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param k: The number of data to be found.
+    :type k: integer
+    :param key: The function to extract comparison key.
+    :type key: function object
+    :param smallest: If true, find the k smallest data instead.
+    :type smallest: bool
+    :returns: generator
+    """
+    if smallest:
+        yield heapq.nsmallest(k, prev, key=key)
+    else:
+        yield heapq.nlargest(k, prev, key=key)
+
+@pipe.func
+def sample(prev, k, seed=None, weight=None):
+    """sample pipe selects k random data from previous pipe by reservoir
+    sampling in a single pass and O(k) memory. A list of selected data is
+    sent to next pipe after the last data.
+
+    Without weight, every data has the same probability to be selected, and
+    the number of random numbers drawn is O(k log(n/k)) by skipping
+    (Algorithm L). With weight, data are selected with probability
+    proportional to weight(data) (Algorithm A-Res).
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param k: The number of data to be selected.
+    :type k: integer
+    :param seed: The seed of random generator.
+    :param weight: The function to get the positive weight of data.
+    :type weight: function object
+    :returns: generator
+    """
+    if k <= 0:
+        yield []
+        return
+    rnd = random.Random(seed)
+    # random() may return 0.0, which can't be passed to math.log.
+    positive_random = lambda: rnd.random() or sys.float_info.min
+    if weight is not None:
+        heap = []
+        for i, data in enumerate(prev):
+            w = weight(data)
+            if w <= 0:
+                continue
+            entry = (rnd.random() ** (1.0 / w), i, data)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[0] > heap[0][0]:
+                heapq.heapreplace(heap, entry)
+        yield [entry[2] for entry in heap]
+        return
+
+    iterator = iter(prev)
+    reservoir = list(itertools.islice(iterator, k))
+    if len(reservoir) < k:
+        yield reservoir
+        return
+    w = math.exp(math.log(positive_random()) / k)
+    while True:
+        skip = min(int(math.log(positive_random()) / math.log1p(-w)), sys.maxsize)
+        data = next(itertools.islice(iterator, skip, None), _empty)
+        if data is _empty:
+            break
+        reservoir[rnd.randrange(k)] = data
+        w *= math.exp(math.log(positive_random()) / k)
+    yield reservoir
+
+
+class _WindowState(object):
+    """The incremental aggregates of data in a window. Data are pushed in
+    order and evicted from the oldest. Each push and evict takes amortized
+    O(1) time. Min and max are kept by monotonic deques.
+    """
+    def __init__(self, agg_names):
+        for name in agg_names:
+            if name not in ('count', 'sum', 'mean', 'min', 'max'):
+                raise ValueError('Unknown aggregate of window: %s' % name)
+        self.agg_names = agg_names
+        self.use_sum = 'sum' in agg_names or 'mean' in agg_names
+        self.use_min = 'min' in agg_names
+        self.use_max = 'max' in agg_names
+        self.items = collections.deque()
+        self.mins = collections.deque()
+        self.maxs = collections.deque()
+        self.total = 0
+        self.sequence = 0
+
+    def push(self, pos, value):
+        entry = (self.sequence, pos, value)
+        self.sequence += 1
+        self.items.append(entry)
+        if self.use_sum:
+            self.total += value
+        if self.use_min:
+            while self.mins and self.mins[-1][2] > value:
+                self.mins.pop()
+            self.mins.append(entry)
+        if self.use_max:
+            while self.maxs and self.maxs[-1][2] < value:
+                self.maxs.pop()
+            self.maxs.append(entry)
+
+    def evict(self, start):
+        """Remove data whose position is less than start."""
+        items = self.items
+        while items and items[0][1] < start:
+            entry = items.popleft()
+            if self.use_sum:
+                self.total -= entry[2]
+            if self.mins and self.mins[0] is entry:
+                self.mins.popleft()
+            if self.maxs and self.maxs[0] is entry:
+                self.maxs.popleft()
+
+    def result(self):
+        results = []
+        for name in self.agg_names:
+            if name == 'count':
+                results.append(len(self.items))
+            elif name == 'sum':
+                results.append(self.total)
+            elif name == 'mean':
+                results.append(self.total / float(len(self.items)))
+            elif name == 'min':
+                results.append(self.mins[0][2])
+            else:
+                results.append(self.maxs[0][2])
+        return tuple(results)
+
+@pipe.func
+def window(prev, size, step=None, by='count', time_key=None, agg='count', value=None, rest=False):
+    """window pipe computes aggregates of data in tumbling or sliding
+    windows. Aggregates are maintained incrementally when data enter and
+    leave the window, so data are never re-scanned. A tuple of (window start,
+    aggregate) is sent to next pipe when a window is closed.
+
+    If by is 'count', a window contains size data and a new window starts
+    every step data. The window start is the index of its first data. If by
+    is 'time', a window covers time range [start, start + size) and starts
+    are multiples of step. The time of data is time_key(data) and must be in
+    ascending order. Windows without data are not sent.
+
+    The available aggregates are count, sum, mean, min and max. If agg is a
+    list, the aggregate in yielded tuple is a tuple of aggregates.
+
+    For example:
+
+    per_minute = readline('metrics.log') | resplit(',') | window(60, by='time', time_key=lambda f: float(f[0]), agg='mean', value=lambda f: float(f[1]))
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param size: The size of window, in number of data or in time.
+    :type size: integer|float
+    :param step: The distance between starts of windows. None means size (tumbling window).
+    :type step: integer|float
+    :param by: 'count' or 'time'.
+    :type by: str
+    :param time_key: The function to get time from data. It is required if by is 'time'.
+    :type time_key: function object
+    :param agg: The name or list of names of aggregate.
+    :type agg: str|list
+    :param value: The function to get value to be aggregated from data. None means data itself.
+    :type value: function object
+    :param rest: If true, the partial windows at the end of count-based windows are sent too.
+    :type rest: bool
+    :returns: generator
+    """
+    step = size if step is None else step
+    agg_names = [agg, ] if is_str_type(agg) else list(agg)
+    state = _WindowState(agg_names)
+    final = (lambda r: r[0]) if is_str_type(agg) else (lambda r: r)
+
+    if by == 'count':
+        start = 0
+        for i, data in enumerate(prev):
+            if i < start:
+                continue
+            state.push(i, data if value is None else value(data))
+            if i + 1 == start + size:
+                yield start, final(state.result())
+                start += step
+                state.evict(start)
+        if rest:
+            while state.items:
+                yield start, final(state.result())
+                start += step
+                state.evict(start)
+        return
+
+    if by != 'time':
+        raise ValueError('Unknown window type: %s' % by)
+    first_start = lambda t: (math.floor((t - size) / float(step)) + 1) * step
+    start = None
+    for data in prev:
+        t = time_key(data)
+        if start is None:
+            start = first_start(t)
+        while t >= start + size:
+            state.evict(start)
+            if state.items:
+                yield start, final(state.result())
+            start += step
+            state.evict(start)
+            if not state.items:
+                start = max(start, first_start(t))
+        state.push(t, data if value is None else value(data))
+
+    if start is not None:
+        state.evict(start)
+        while state.items:
+            yield start, final(state.result())
+            start += step
+            state.evict(start)
+
+
+class _Partitions(object):
+    """Items spilled to temporary files, partitioned by the hash of key.
+    Items are buffered and pickled in chunks.
+    """
+    def __init__(self, num, chunk=1024):
+        self.files = [tempfile.TemporaryFile() for i in range(num)]
+        self.buffers = [[] for i in range(num)]
+        self.chunk = chunk
+
+    def add(self, key, item):
+        p = hash(key) % len(self.files)
+        buf = self.buffers[p]
+        buf.append(item)
+        if len(buf) >= self.chunk:
+            pickle.dump(buf, self.files[p], pickle.HIGHEST_PROTOCOL)
+            self.buffers[p] = []
+
+    def read(self, p):
+        """Read items of partition p."""
+        fd = self.files[p]
+        if self.buffers[p]:
+            pickle.dump(self.buffers[p], fd, pickle.HIGHEST_PROTOCOL)
+            self.buffers[p] = []
+        fd.seek(0)
+        return _load_run(fd)
+
+    def close(self):
+        for fd in self.files:
+            fd.close()
+
+@pipe.func
+def hashjoin(prev, other, key, other_key=None, how='inner', max_rows=None, partitions=16):
+    """hashjoin pipe joins data from previous pipe with data of other. A hash
+    table is built from other, which should be the smaller one. Then, it is
+    probed by key(data) of each data from previous pipe. For each match, a
+    tuple of (data, other data) is sent to next pipe. If how is 'left', the
+    data without match is sent as (data, None).
+
+    If max_rows is specified and other has more rows, both sides are
+    partitioned by the hash of key to temporary files and joined partition
+    by partition (grace hash join). The data must be picklable, and the
+    order of output is not kept in this case.
+
+    For example:
+
+    enriched = readline('access.log') | resplit(' ') | hashjoin(csv_read('hosts.csv'), key=lambda f: f[0], other_key=lambda h: h[0], how='left')
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param other: The Pipe object or iterable object to build hash table.
+    :type other: Pipe|iterable
+    :param key: The function to get join key from data of previous pipe.
+    :type key: function object
+    :param other_key: The function to get join key from data of other. None means key.
+    :type other_key: function object
+    :param how: 'inner' or 'left'.
+    :type how: str
+    :param max_rows: The maximum number of rows of other in memory. None means no limit.
+    :type max_rows: integer
+    :param partitions: The number of partitions for grace hash join.
+    :type partitions: integer
+    :returns: generator
+    """
+    if how not in ('inner', 'left'):
+        raise ValueError('Unknown join type: %s' % how)
+    other_key = key if other_key is None else other_key
+    build_rows = other.iter() if isinstance(other, Pipe) else iter(other)
+
+    def build(rows, limit):
+        table = {}
+        num = 0
+        for row in rows:
+            table.setdefault(other_key(row), []).append(row)
+            num += 1
+            if limit is not None and num > limit:
+                return table, True
+        return table, False
+
+    def probe(table, rows):
+        for data in rows:
+            matches = table.get(key(data))
+            if matches:
+                for row in matches:
+                    yield data, row
+            elif how == 'left':
+                yield data, None
+
+    table, overflow = build(build_rows, max_rows)
+    if not overflow:
+        for pair in probe(table, prev):
+            yield pair
+        return
+
+    build_parts = _Partitions(partitions)
+    probe_parts = _Partitions(partitions)
+    try:
+        for k, rows in table.items():
+            for row in rows:
+                build_parts.add(k, row)
+        table = None
+        for row in build_rows:
+            build_parts.add(other_key(row), row)
+        for data in prev:
+            probe_parts.add(key(data), data)
+        for p in range(partitions):
+            table, overflow = build(build_parts.read(p), None)
+            for pair in probe(table, probe_parts.read(p)):
+                yield pair
+    finally:
+        build_parts.close()
+        probe_parts.close()
+
+
+class _Branch(object):
+    """A sub-pipeline of tee which runs in its own thread. Data is passed to
+    it by chunks through a bounded queue.
+    """
+    def __init__(self, sub, size):
+        self.compiled = sub.compile()
+        self.queue = queue.Queue(size)
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self.main)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def items(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            for item in chunk:
+                yield item
+
+    def main(self):
+        try:
+            self.result = self.compiled.result(self.items())
+        except BaseException as e:
+            self.error = e
+
+    def put(self, chunk):
+        """Put chunk to queue unless the thread is finished."""
+        while self.thread.is_alive():
+            try:
+                self.queue.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def join(self):
+        self.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+@pipe.func
+def tee(prev, *subs, **kw):
+    """tee pipe sends each data from previous pipe to all sub-pipelines in a
+    single pass. The previous pipe is consumed only once. After all data is
+    processed, a tuple of results of sub-pipelines is sent to next pipe. The
+    result of a sub-pipeline is a list as :py:meth:`Pipe.result`.
+
+    By default, the sub-pipelines are run one by one over itertools.tee, so
+    the data are kept in memory until the last sub-pipeline consumes them. If
+    threads is True, each sub-pipeline runs in its own thread with a bounded
+    buffer, so the memory usage is limited.
+
+    For example:
+
+    count, top, distinct = run(walk('logs') | wildcard('*.log') | readline | tee(counter, topk(10), uniq | counter, threads=True))
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param subs: The sub-pipelines.
+    :type subs: Pipe
+    :param threads: True to run each sub-pipeline in its own thread.
+    :type threads: bool
+    :param buffer_size: The maximum number of data chunks buffered for each thread.
+    :type buffer_size: integer
+    :param chunk_size: The number of data in a chunk.
+    :type chunk_size: integer
+    :returns: generator
+    """
+    threads = kw.pop('threads', False)
+    buffer_size = kw.pop('buffer_size', 16)
+    chunk_size = kw.pop('chunk_size', 256)
+    if kw:
+        raise TypeError('Unexpected keyword arguments: %s' % ', '.join(kw))
+
+    if not threads:
+        sources = itertools.tee(prev, len(subs)) if subs else ()
+        yield tuple(sub.compile().result(source) for sub, source in zip(subs, sources))
+        return
+
+    branches = []
+    try:
+        for sub in subs:
+            branches.append(_Branch(sub, buffer_size))
+        for chunk in batches(prev, chunk_size):
+            for branch in branches:
+                branch.put(chunk)
+        results = tuple(branch.join() for branch in branches)
+    finally:
+        for branch in branches:
+            branch.put(None)
+    yield results
+
+
+@pipe.func
+def partition(prev, key, workers=None, sub=None, chunk_size=1024):
+    """partition pipe partitions data from previous pipe by the hash of
+    key(data), and runs a copy of sub-pipeline for each partition in its own
+    worker process. The outputs of workers are sent to next pipe in the order
+    of arrival. Because the data with the same key always go to the same
+    worker, the stateful sub-pipelines like groupby and uniq work per key
+    without coordination among workers.
+
+    The workers are forked, so sub-pipeline is not pickled, but the data and
+    outputs must be picklable. If fork is not available on this platform,
+    sub-pipeline runs over all data in current process.
+
+    For example:
+
+    readline('access.log') | resplit(' ') | partition(key=lambda f: f[0], workers=4, sub=groupby(lambda f: f[0], 'count'))
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param key: The function to get partition key from data.
+    :type key: function object
+    :param workers: The number of worker processes. None means the number of CPUs.
+    :type workers: integer
+    :param sub: The sub-pipeline to be run in each worker.
+    :type sub: Pipe
+    :param chunk_size: The number of data transferred to or from worker at once.
+    :type chunk_size: integer
+    :returns: generator
+    """
+    if sub is None:
+        raise TypeError('partition requires a sub-pipeline.')
+    compiled = sub.compile()
+    workers = workers or os.cpu_count() or 1
+    context = fork_context()
+    if context is None:
+        for data in compiled.iter(prev):
+            yield data
+        return
+
+    def target(chunks):
+        items = (data for chunk in chunks for data in chunk)
+        return batches(compiled.iter(items), chunk_size)
+
+    def inputs():
+        buffers = [[] for i in range(workers)]
+        for data in prev:
+            index = hash(key(data)) % workers
+            buf = buffers[index]
+            buf.append(data)
+            if len(buf) >= chunk_size:
+                yield index, buf
+                buffers[index] = []
+        for index, buf in enumerate(buffers):
+            if buf:
+                yield index, buf
+
+    for index, chunk in ForkPool(context, target, workers).run(inputs()):
+        for data in chunk:
+            yield data
+
+
+@pipe.func
+def parallel(prev, sub, workers=None, chunk_size=1024, ordered=True, serializer='pickle', stats=None):
+    """parallel pipe runs sub-pipeline in forked worker processes. Data from
+    previous pipe are sent to workers by chunks in turn, and each chunk is
+    processed by sub-pipeline independently. So, sub-pipeline should be
+    stateless, e.g. pipe.map and pipe.filter. The outputs are sent to next
+    pipe in the original order, or in the order of arrival if ordered is False.
+
+    The workers are forked with sub-pipeline pre-bound, so the lambdas in it
+    are not pickled. The chunks are serialized by pickle protocol 5 with
+    out-of-band buffers, or by marshal, which is faster for the data of
+    built-in types. If fork is not available on this platform, sub-pipeline
+    runs in current process.
+
+    For example:
+
+    stats = {}
+    walk('logs') | wildcard('*.log') | readline | parallel(pipe.map(parse_line) | pipe.filter(is_error), workers=4, serializer='marshal', stats=stats) | stdout
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param sub: The sub-pipeline to be run in workers.
+    :type sub: Pipe
+    :param workers: The number of worker processes. None means the number of CPUs.
+    :type workers: integer
+    :param chunk_size: The number of data transferred to worker at once.
+    :type chunk_size: integer
+    :param ordered: True to keep the order of data.
+    :type ordered: bool
+    :param serializer: 'pickle' or 'marshal'.
+    :type serializer: str
+    :param stats: The dict to be filled with statistics of each worker after
+                  all data is processed, indexed by worker number.
+    :type stats: dict
+    :returns: generator
+    """
+    compiled = sub.compile()
+    workers = workers or os.cpu_count() or 1
+    context = fork_context()
+    if context is None:
+        for data in compiled.iter(prev):
+            yield data
+        return
+
+    def target(chunks):
+        for chunk in chunks:
+            yield compiled.result(chunk)
+
+    pool = ForkPool(context, target, workers, serializer)
+    for chunk in pool.map(batches(prev, chunk_size), ordered):
+        for data in chunk:
+            yield data
+    if stats is not None:
+        stats.update(pool.stats)
+
+
 @pipe.func
 def fmt(prev, format_string):
     """The pipe formats the data passed from previous generator according to
@@ -343,13 +1761,16 @@ def match(prev, *patterns, **kw):
     If 'to' is dict, yield MatchObject.groupdict().
     If 'to' is tuple, yield MatchObject.groups().
     If 'to' is list, yield list(MatchObject.groups()).
+    If 'to' is 'record', yield a record whose fields are the group names. The
+    record class is made once per pattern. Unnamed groups are named as
+    'group<N>'. Check record_type() for detail.
 
     :param prev: The previous iterator of pipe.
     :type prev: Pipe
     :param pattern: The pattern which used to filter data. When more than one pattern specified, the data is passed if it matches any pattern.
     :type pattern: str|unicode
-    :param to: What data type the result should be stored. dict|tuple|list
-    :type to: type
+    :param to: What data type the result should be stored. dict|tuple|list|'record'
+    :type to: type|str
     :returns: generator
     """
     inv = kw.pop('inv', False)
@@ -358,6 +1779,14 @@ def match(prev, *patterns, **kw):
     for pattern in patterns:
         pattern_objs.append(re.compile(pattern, **kw))
 
+    if to == 'record':
+        make_records = {}
+        for pattern_obj in pattern_objs:
+            group_names = ['group%d' % (i + 1) for i in range(pattern_obj.groups)]
+            for name, index in pattern_obj.groupindex.items():
+                group_names[index - 1] = name
+            make_records[pattern_obj] = record_type(tuple(group_names))._make
+
     for data in prev:
         match = None
         for pattern_obj in pattern_objs:
@@ -365,7 +1794,9 @@ def match(prev, *patterns, **kw):
             if match is not None:
                 break
         if bool(inv) ^ (match is not None):
-            if to is dict:
+            if to == 'record':
+                yield make_records[pattern_obj](match.groups())
+            elif to is dict:
                 yield match.groupdict()
             elif to is tuple:
                 yield tuple(match.groups())
@@ -584,6 +2015,10 @@ def sh(prev, *args, **kw):
         subprocess.CalledProcessError will be raised.
     - decode: The codecs to be used to decode the output of shell.
     - stderr: If provided, the stderr of shell process will be passed to next pipe object with a prefix specified by stderr argument.
+    - memo: If true, the output and returncode of shell process are memoized. They are keyed by
+        command line, cwd, environment and the digest of stdin. Next invocation with the same key
+        doesn't create process. Set it to a LRUCache object to use your own storage. Use
+        clear_memo() to invalidate memoized output.
 
     For example:
 
@@ -600,6 +2035,7 @@ def sh(prev, *args, **kw):
     endl = kw.pop('endl', '\n')
     returncode = kw.pop('returncode', None)
     stderr = kw.pop('stderr', False)
+    memo = kw.pop('memo', False)
     if PY3:
         decode = functools.partial(codecs.decode, encoding=locale.getdefaultlocale()[1]) if 'decode' not in kw else kw.pop('decode')
     else:
@@ -615,6 +2051,22 @@ def sh(prev, *args, **kw):
             while True:
                 yield None
 
+    if memo is not None and memo is not False:
+        stdin_data = None
+        if prev is not None:
+            stdin_data = ''.join(i + endl if endl else i for i in prev).encode('utf-8')
+        stdout_lines, stderr_lines, process_returncode = _memo_command(memo, cmdline, stdin_data, bool(stderr), kw)
+        for line in stdout_lines:
+            yield trim(decode(line))
+        for line in stderr_lines:
+            if isinstance(stderr, str):
+                yield stderr + trim(decode(line))
+            else:
+                yield trim(decode(line))
+        if returncode is not None and returncode != process_returncode:
+            raise subprocess.CalledProcessError(returncode=process_returncode, cmd=cmdline)
+        return
+
     process = subprocess.Popen(cmdline, shell=True,
         stdin=subprocess.PIPE, stdout=subprocess.PIPE, 
         stderr=None if not stderr else subprocess.PIPE,
@@ -654,6 +2106,9 @@ def execmd(prev, *args, **kw):
 
     py_files = result(readline("dir_list.txt", trim=str.strip) | fmt("ls {}") | execmd )
 
+    Set 'memo' in keyword argument to memoize the output of commands. Check
+    sh pipe for detail.
+
     :param prev: The previous iterator of pipe.
     :type prev: Pipe
     :param kw: arguments for subprocess.Popen.
@@ -662,6 +2117,7 @@ def execmd(prev, *args, **kw):
     """
     returncode = kw.pop('returncode', None)
     stderr = kw.pop('stderr', False)
+    memo = kw.pop('memo', False)
     if PY3:
         decode = functools.partial(codecs.decode, encoding=locale.getdefaultlocale()[1]) if 'decode' not in kw else kw.pop('decode')
     else:
@@ -669,6 +2125,19 @@ def execmd(prev, *args, **kw):
     trim = (lambda s: s.rstrip()) if 'trim' not in kw else kw.pop('trim')
 
     for cmdline in prev:
+        if memo is not None and memo is not False:
+            stdout_lines, stderr_lines, process_returncode = _memo_command(memo, cmdline, None, bool(stderr), kw)
+            for line in stdout_lines:
+                yield trim(decode(line))
+            for line in stderr_lines:
+                if isinstance(stderr, str):
+                    yield stderr + trim(decode(line))
+                else:
+                    yield trim(decode(line))
+            if returncode is not None and returncode != process_returncode:
+                raise subprocess.CalledProcessError(returncode=process_returncode, cmd=cmdline)
+            continue
+
         process = subprocess.Popen(cmdline, shell=True,
             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
             stderr=None if not stderr else subprocess.PIPE,
@@ -685,23 +2154,870 @@ def execmd(prev, *args, **kw):
         if returncode is not None and returncode != process.returncode:
             raise subprocess.CalledProcessError(returncode=process.returncode, cmd=cmdline)
 
+def _input_lines(prev, filename, encoding):
+    """Get lines from previous pipe, or from files if previous pipe is None.
+
+    :param prev: The previous iterator of pipe.
+    :param filename: The files to be read if prev is None.
+    :type filename: None|str|unicode|list|tuple
+    :param encoding: The encoding of files.
+    :type encoding: str
+    :returns: generator
+    """
+    if prev is not None:
+        for line in prev:
+            yield line
+        return
+    if filename is None:
+        raise Exception('No input available.')
+    for fn in ([filename, ] if is_str_type(filename) else filename):
+        with open(fn, 'r', encoding=encoding, newline='') as fd:
+            for line in fd:
+                yield line
+
+def _map_blocks(func, blocks, workers, *args):
+    """Apply func to each block in forked worker processes and yield results
+    in order. func and args are bound before forking, so only the blocks and
+    results are pickled. If workers is None or fork is not available, func
+    is called in current process.
+
+    :param func: The function to be applied to blocks.
+    :type func: function object
+    :param blocks: The iterable of blocks.
+    :param workers: The number of worker processes.
+    :type workers: integer
+    :param args: The extra arguments of func.
+    :returns: generator
+    """
+    context = fork_context() if workers else None
+    if context is None:
+        for block in blocks:
+            yield func(block, *args)
+        return
+    target = lambda blocks: (func(block, *args) for block in blocks)
+    for parsed in ForkPool(context, target, workers).map(blocks):
+        yield parsed
+
+def _parse_csv_block(lines, fmtparams):
+    """Parse a block of CSV lines into list of rows."""
+    return list(csv.reader(lines, **fmtparams))
+
+def _parse_jsonl_block(lines):
+    """Parse a block of JSON lines into list of objects."""
+    decode = json.JSONDecoder().decode
+    return [decode(line) for line in lines if line.strip()]
+
+@pipe.func
+def csv_read(prev, filename=None, header=False, workers=None, chunk=4096, encoding='utf-8', **fmtparams):
+    """csv_read pipe parses CSV lines from previous pipe, or from files if
+    previous pipe is None. Each row is sent to next pipe as a list, or a dict
+    if header is specified.
+
+    The keyword arguments which are not listed below are passed to csv.reader
+    as format parameters, e.g. delimiter and quotechar.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param filename: The files to be read if previous pipe is None.
+    :type filename: None|str|unicode|list|tuple
+    :param header: If true, the first row is used as field names and each row
+                   is sent as a dict. If it is a list, it is used as field names.
+    :type header: bool|list
+    :param workers: The number of processes to parse lines in parallel. It
+                    should be used only if no quoted field contains newlines.
+    :type workers: integer
+    :param chunk: The number of lines to be parsed in a block.
+    :type chunk: integer
+    :param encoding: The encoding of files.
+    :type encoding: str
+    :returns: generator
+    """
+    lines = _input_lines(prev, filename, encoding)
+    if workers:
+        rows = (row for block in _map_blocks(_parse_csv_block, batches(lines, chunk), workers, fmtparams)
+                for row in block)
+    else:
+        rows = csv.reader(lines, **fmtparams)
+
+    if header is True:
+        header = next(rows, None)
+        if header is None:
+            return
+    if not header:
+        for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield dict(zip(header, row))
+
+@pipe.func
+def csv_write(prev, file_handle, header=None, thru=False, chunk=4096, encoding='utf-8', **fmtparams):
+    """csv_write pipe writes rows from previous pipe to a CSV file. A row can
+    be a list, a tuple or a dict. Rows are written in blocks by writerows.
+
+    The keyword arguments which are not listed below are passed to csv.writer
+    as format parameters, e.g. delimiter and quotechar.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param file_handle: The file object or the filename to write.
+    :type file_handle: file object|str
+    :param header: The field names. It is written as the first row. If rows
+                   are dicts and header is None, the keys of first row are used.
+    :type header: list
+    :param thru: If true, data will passed to next generator. If false, data
+                 will be dropped.
+    :type thru: bool
+    :param chunk: The number of rows to be written in a block.
+    :type chunk: integer
+    :param encoding: The encoding of file if filename is given.
+    :type encoding: str
+    :returns: generator
+    """
+    fd = open(file_handle, 'w', encoding=encoding, newline='') if is_str_type(file_handle) else file_handle
+    try:
+        writer = None
+        for block in batches(prev, chunk):
+            if writer is None:
+                if isinstance(block[0], dict):
+                    writer = csv.DictWriter(fd, header or list(block[0].keys()), **fmtparams)
+                    writer.writeheader()
+                else:
+                    writer = csv.writer(fd, **fmtparams)
+                    if header:
+                        writer.writerow(header)
+            writer.writerows(block)
+            if thru:
+                for row in block:
+                    yield row
+    finally:
+        if fd is not file_handle:
+            fd.close()
+
+@pipe.func
+def jsonl_read(prev, filename=None, workers=None, chunk=4096, encoding='utf-8'):
+    """jsonl_read pipe parses JSON Lines from previous pipe, or from files if
+    previous pipe is None. Empty lines are skipped.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param filename: The files to be read if previous pipe is None.
+    :type filename: None|str|unicode|list|tuple
+    :param workers: The number of processes to parse lines in parallel.
+    :type workers: integer
+    :param chunk: The number of lines to be parsed in a block.
+    :type chunk: integer
+    :param encoding: The encoding of files.
+    :type encoding: str
+    :returns: generator
+    """
+    lines = _input_lines(prev, filename, encoding)
+    for block in _map_blocks(_parse_jsonl_block, batches(lines, chunk), workers):
+        for obj in block:
+            yield obj
+
+@pipe.func
+def jsonl_write(prev, file_handle, thru=False, chunk=4096, encoding='utf-8', **kw):
+    """jsonl_write pipe writes data from previous pipe to a JSON Lines file.
+    Data are encoded and written in blocks by writelines.
+
+    The keyword arguments which are not listed below are passed to
+    json.JSONEncoder.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param file_handle: The file object or the filename to write.
+    :type file_handle: file object|str
+    :param thru: If true, data will passed to next generator. If false, data
+                 will be dropped.
+    :type thru: bool
+    :param chunk: The number of data to be written in a block.
+    :type chunk: integer
+    :param encoding: The encoding of file if filename is given.
+    :type encoding: str
+    :returns: generator
+    """
+    encode = json.JSONEncoder(**kw).encode
+    fd = open(file_handle, 'w', encoding=encoding) if is_str_type(file_handle) else file_handle
+    try:
+        for block in batches(prev, chunk):
+            fd.writelines([encode(obj) + '\n' for obj in block])
+            if thru:
+                for obj in block:
+                    yield obj
+    finally:
+        if fd is not file_handle:
+            fd.close()
+
+def _load_walk_index(index_file):
+    """Load the directory index used by walk pipe.
+
+    :param index_file: The path of index file.
+    :type index_file: str
+    :returns: dict which maps directory path to [mtime, dir_names, filenames].
+    """
+    try:
+        with open(index_file, 'r') as fd:
+            index = json.load(fd)
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(index, dict):
+        return {}
+    return index
+
+
+def _atomic_dump(obj, filename, dump=json.dump, mode='w'):
+    """Dump object to file. The object is written to a temporary file first
+    and then renamed, so a concurrent reader never sees a partially written
+    file.
+
+    :param obj: The object to be saved.
+    :param filename: The path of file.
+    :type filename: str
+    :param dump: The function to serialize obj into file object.
+    :type dump: function object
+    :param mode: The mode to open file.
+    :type mode: str
+    """
+    tmp_file = '%s.%d.%d.tmp' % (filename, os.getpid(), threading.current_thread().ident)
+    with open(tmp_file, mode) as fd:
+        dump(obj, fd)
+    os.replace(tmp_file, filename)
+
+
+def _walk_with_index(top, index_file):
+    """Work like os.walk but reuse the listing of directories whose mtime
+    is unchanged since the index was saved.
+
+    :param top: The initial path.
+    :type top: str
+    :param index_file: The path of index file.
+    :type index_file: str
+    :returns: generator of (dir_path, dir_names, filenames)
+    """
+    old_index = _load_walk_index(index_file)
+    new_index = {}
+    pending = [top]
+    while pending:
+        dir_path = pending.pop()
+        try:
+            mtime = os.stat(dir_path).st_mtime
+        except OSError:
+            continue
+        cached = old_index.get(dir_path)
+        if cached is not None and cached[0] == mtime:
+            dir_names, filenames = cached[1], cached[2]
+        else:
+            dir_names, filenames = [], []
+            try:
+                entries = list(os.scandir(dir_path))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dir_names.append(entry.name)
+                else:
+                    filenames.append(entry.name)
+        new_index[dir_path] = [mtime, dir_names, filenames]
+        yield dir_path, dir_names, filenames
+        for dir_name in reversed(dir_names):
+            sub_path = os.path.join(dir_path, dir_name)
+            # Don't follow symbolic links, the same as os.walk.
+            if not os.path.islink(sub_path):
+                pending.append(sub_path)
+    _atomic_dump(new_index, index_file)
+
+
 @pipe.func
 def walk(prev, inital_path, *args, **kw):
     """This pipe wrap os.walk and yield absolute path one by one.
 
+    If 'index' is given in kw, the directory listing is stored in that file
+    together with the mtime of each directory. The next walk only re-lists the
+    directories whose mtime changed, so repeated walks over a mostly unchanged
+    tree cost one stat per directory. The index is updated after the walk
+    completes.
+
     :param prev: The previous iterator of pipe.
     :type prev: Pipe
     :param args: The end-of-line symbol for each output.
     :type args: list of string.
     :param kw: The end-of-line symbol for each output.
     :type kw: dictionary of options. Add 'endl' in kw to specify end-of-line symbol.
+              Add 'index' in kw to specify the path of directory index file.
     :returns: generator
     """
-    for dir_path, dir_names, filenames in os.walk(inital_path):
+    index_file = kw.pop('index', None)
+    if index_file is None:
+        walker = os.walk(inital_path)
+    else:
+        walker = _walk_with_index(inital_path, index_file)
+    for dir_path, dir_names, filenames in walker:
         for filename in filenames:
             yield os.path.join(dir_path, filename)
 
 
+def _file_digest(filename, block_size=1 << 20):
+    """Calculate the SHA-1 digest of file content.
+
+    :param filename: The file to be hashed.
+    :type filename: str
+    :returns: hex digest string.
+    """
+    h = hashlib.sha1()
+    with open(filename, 'rb') as fd:
+        for block in iter(lambda: fd.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+@pipe.func
+def incremental(prev, sub_pipe, manifest, digest=False, replay=True, version=None):
+    """incremental pipe takes filenames from previous pipe and sends each of
+    them to sub_pipe. The (size, mtime, inode) of each file and the data
+    generated by sub_pipe are recorded in manifest file. In next run, the
+    files which are not changed are not read again, their recorded data are
+    replayed instead.
+
+    The manifest is updated only if all data from previous pipe have been
+    processed. The data generated by sub_pipe must be picklable. The
+    fingerprint of sub_pipe and version are also recorded, so the recorded
+    data are dropped if either of them is changed. Check fingerprint() for
+    detail. If the fingerprint can't be calculated, e.g. sub_pipe has a file
+    object argument, only version is checked.
+
+    For example:
+
+    errors = walk('/var/log/myapp') | incremental(readline | grep('ERROR'), 'errors.manifest')
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param sub_pipe: The pipe to process one file. Its input is the filename.
+    :type sub_pipe: Pipe
+    :param manifest: The path of manifest file.
+    :type manifest: str
+    :param digest: If true, a file whose stat is changed is treated as
+                   unchanged when its content digest is the same.
+    :type digest: bool
+    :param replay: If false, the recorded data of unchanged files are not
+                   sent to next pipe. Only the data of new or changed files are.
+    :type replay: bool
+    :param version: The token to be recorded. Change it to drop the recorded
+                    data when things outside of fingerprint of sub_pipe are
+                    changed.
+    :type version: str
+    :returns: generator
+    """
+    if prev is None:
+        raise TypeError('incremental must have input.')
+    try:
+        pipe_fingerprint = fingerprint(sub_pipe)
+    except TypeError:
+        pipe_fingerprint = None
+    try:
+        with open(manifest, 'rb') as fd:
+            content = pickle.load(fd)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        content = {}
+    if 'records' in content and content.get('fingerprint') == pipe_fingerprint and content.get('version') == version:
+        old_records = content['records']
+    else:
+        old_records = {}
+
+    new_records = {}
+    for filename in prev:
+        st = os.stat(filename)
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        record = old_records.get(filename)
+        if record is not None and record['signature'] != signature and digest:
+            if record['digest'] == _file_digest(filename):
+                record['signature'] = signature
+        if record is not None and record['signature'] == signature:
+            new_records[filename] = record
+            if replay:
+                for data in record['output']:
+                    yield data
+            continue
+
+        output = []
+        for data in seq([filename, ]) | sub_pipe:
+            output.append(data)
+            yield data
+        new_records[filename] = dict(
+            signature=signature,
+            digest=_file_digest(filename) if digest else None,
+            output=output)
+
+    content = dict(fingerprint=pipe_fingerprint, version=version, records=new_records)
+    _atomic_dump(content, manifest, pickle.dump, 'wb')
+
+class LRUCache(object):
+    """A thread-safe dict-like container which keeps at most maxsize items.
+    The least recently used item is dropped when it is full.
+    """
+    def __init__(self, maxsize=1024):
+        """Constructor of LRUCache.
+
+        :param maxsize: The maximum number of items to be kept.
+        :type maxsize: integer
+        """
+        self.maxsize = maxsize
+        self.data = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get the item of key and mark it as the most recently used one.
+
+        :param key: The key of item.
+        :param default: The value to be returned if key is not found.
+        :returns: The value of item or default.
+        """
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def put(self, key, value):
+        """Put an item into cache.
+
+        :param key: The key of item.
+        :param value: The value of item.
+        """
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove the item of key.
+
+        :param key: The key of item.
+        :param default: The value to be returned if key is not found.
+        :returns: The value of removed item or default.
+        """
+        with self.lock:
+            return self.data.pop(key, default)
+
+    def pop_if(self, predicate):
+        """Remove the items whose key satisfies predicate.
+
+        :param predicate: The function which takes a key and returns true to remove it.
+        :type predicate: function object
+        :returns: The number of removed items.
+        :rtype: integer
+        """
+        with self.lock:
+            keys = [key for key in self.data if predicate(key)]
+            for key in keys:
+                del self.data[key]
+        return len(keys)
+
+    def clear(self):
+        """Remove all items."""
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+
+class DiskCache(object):
+    """A directory of pickled values. The least recently used files are
+    removed when the total size exceeds max_bytes.
+    """
+    def __init__(self, directory, max_bytes=None):
+        """Constructor of DiskCache.
+
+        :param directory: The directory to store cached values.
+        :type directory: str
+        :param max_bytes: The maximum total size of cached files. None means no limit.
+        :type max_bytes: integer
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.total_bytes = sum(os.path.getsize(fn) for fn in self._files())
+
+    def _files(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                yield os.path.join(self.directory, name)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key, default=None):
+        """Get the value of key. The file of key is touched to mark it as
+        the most recently used one.
+
+        :param key: The key of value. It must be valid as a filename.
+        :type key: str
+        :param default: The value to be returned if key is not found.
+        :returns: The value or default.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fd:
+                value = pickle.load(fd)
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return default
+        return value
+
+    def put(self, key, value):
+        """Put a value into cache and evict old files if needed.
+
+        :param key: The key of value. It must be valid as a filename.
+        :type key: str
+        :param value: The picklable value.
+        """
+        path = self._path(key)
+        if os.path.exists(path):
+            self.total_bytes -= os.path.getsize(path)
+        _atomic_dump(value, path, pickle.dump, 'wb')
+        self.total_bytes += os.path.getsize(path)
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            self.evict(self.max_bytes)
+
+    def pop(self, key):
+        """Remove the value of key.
+
+        :param key: The key of value.
+        :type key: str
+        """
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.total_bytes -= size
+        except OSError:
+            pass
+
+    def evict(self, max_bytes):
+        """Remove the least recently used files until total size is not
+        larger than max_bytes.
+
+        :param max_bytes: The size limit.
+        :type max_bytes: integer
+        """
+        files = []
+        for fn in self._files():
+            try:
+                st = os.stat(fn)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, fn))
+        files.sort()
+        self.total_bytes = sum(f[1] for f in files)
+        for mtime, size, fn in files:
+            if self.total_bytes <= max_bytes:
+                break
+            try:
+                os.remove(fn)
+            except OSError:
+                continue
+            self.total_bytes -= size
+
+    def clear(self):
+        """Remove all cached files."""
+        self.evict(0)
+
+
+def _code_fingerprint(code, h):
+    """Update hash object with the content of a code object."""
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode('utf-8'))
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _code_fingerprint(const, h)
+        else:
+            _value_fingerprint(const, h)
+
+
+def _code_names(code):
+    """Get the global and attribute names used by a code object and the code
+    objects nested in it.
+    """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.update(_code_names(const))
+    return names
+
+
+def _globals_fingerprint(func, h, depth):
+    """Update hash object with the global variables referred by a function.
+    Only functions and immutable values (numbers, strings, and tuples or
+    frozensets of them) are hashed. Mutable objects are skipped, because
+    their content, e.g. a counter list, usually changes from call to call.
+    The functions of cmdlet itself are not resolved.
+    """
+    module = func.__module__ or ''
+    if module == 'cmdlet' or module.startswith('cmdlet.') or depth > 8:
+        return
+    func_globals = func.__globals__
+    for name in sorted(_code_names(func.__code__)):
+        if name not in func_globals:
+            continue
+        value = func_globals[name]
+        if value is func:
+            continue
+        if not isinstance(value, (types.FunctionType, bool, int, float, complex, string_type, bytes, tuple, frozenset)):
+            continue
+        item_hash = hashlib.sha1(name.encode('utf-8'))
+        try:
+            _value_fingerprint(value, item_hash, depth + 1)
+        except TypeError:
+            continue
+        h.update(item_hash.digest())
+
+
+def _callable_fingerprint(func, h, depth=0):
+    """Update hash object with the code, default arguments, closure and
+    referred global variables of a function.
+    """
+    h.update((func.__module__ or '').encode('utf-8'))
+    h.update(getattr(func, '__qualname__', func.__name__).encode('utf-8'))
+    _code_fingerprint(func.__code__, h)
+    _value_fingerprint(func.__defaults__, h, depth)
+    _value_fingerprint(getattr(func, '__kwdefaults__', None), h, depth)
+    for cell in func.__closure__ or ():
+        try:
+            content = cell.cell_contents
+        except ValueError:
+            continue
+        _value_fingerprint(content, h, depth + 1)
+    _globals_fingerprint(func, h, depth)
+
+
+def _value_fingerprint(value, h, depth=0):
+    """Update hash object with a form of value which is stable across
+    processes. Pipes, functions and partial objects are hashed by their
+    content instead of repr(), which may contain memory addresses. Other
+    objects are hashed by pickle.
+
+    :raises TypeError: If value can't be represented stably.
+    """
+    if depth > 16:
+        raise TypeError('Too deeply nested to fingerprint: %r' % type(value))
+    if value is None or isinstance(value, (bool, int, float, complex, string_type, bytes)):
+        h.update(b'v' + repr(value).encode('utf-8'))
+    elif isinstance(value, (list, tuple)):
+        h.update(('%s%d' % (type(value).__name__, len(value))).encode('utf-8'))
+        for item in value:
+            _value_fingerprint(item, h, depth + 1)
+    elif isinstance(value, (set, frozenset)):
+        digests = []
+        for item in value:
+            item_hash = hashlib.sha1()
+            _value_fingerprint(item, item_hash, depth + 1)
+            digests.append(item_hash.digest())
+        h.update(b'set' + b''.join(sorted(digests)))
+    elif isinstance(value, dict):
+        h.update(('dict%d' % len(value)).encode('utf-8'))
+        digests = []
+        for k, v in value.items():
+            item_hash = hashlib.sha1()
+            _value_fingerprint(k, item_hash, depth + 1)
+            _value_fingerprint(v, item_hash, depth + 1)
+            digests.append(item_hash.digest())
+        h.update(b''.join(sorted(digests)))
+    elif isinstance(value, Pipe):
+        h.update(b'pipe')
+        _pipe_fingerprint(value, h, depth + 1)
+    elif isinstance(value, functools.partial):
+        h.update(b'partial')
+        _value_fingerprint(value.func, h, depth + 1)
+        _value_fingerprint(value.args, h, depth + 1)
+        _value_fingerprint(value.keywords, h, depth + 1)
+    elif isinstance(value, types.MethodType):
+        h.update(b'method')
+        _value_fingerprint(value.__func__, h, depth + 1)
+        _value_fingerprint(value.__self__, h, depth + 1)
+    elif isinstance(value, types.FunctionType):
+        h.update(b'function')
+        _callable_fingerprint(value, h, depth + 1)
+    elif isinstance(value, (type, types.ModuleType)):
+        h.update(('%s.%s' % (getattr(value, '__module__', ''), getattr(value, '__qualname__', value.__name__))).encode('utf-8'))
+    elif isinstance(value, types.BuiltinFunctionType):
+        h.update(('builtin %s' % value.__qualname__).encode('utf-8'))
+        if value.__self__ is not None and not isinstance(value.__self__, types.ModuleType):
+            _value_fingerprint(value.__self__, h, depth + 1)
+    elif isinstance(value, (types.MethodDescriptorType, types.WrapperDescriptorType)):
+        # Methods of built-in types, e.g. str.upper.
+        h.update(repr(value).encode('utf-8'))
+    else:
+        try:
+            data = pickle.dumps(value, protocol=2)
+        except Exception:
+            raise TypeError('Cannot fingerprint object of type %r' % type(value))
+        h.update(b'pickle' + data)
+
+
+def _pipe_fingerprint(pipe_obj, h, depth=0):
+    """Update hash object with functions and arguments of cascaded pipes."""
+    while pipe_obj is not None:
+        _value_fingerprint(pipe_obj.func, h, depth)
+        _value_fingerprint(pipe_obj.args, h, depth)
+        _value_fingerprint(pipe_obj.kw, h, depth)
+        pipe_obj = pipe_obj.next
+
+
+def fingerprint(pipe_obj):
+    """Generate a stable fingerprint of cascaded pipes. It is calculated from
+    the code, arguments, closures and referred global functions and constants
+    of wrapped functions. It is used as a part of cache key, so changing the
+    pipes invalidates cached results.
+
+    Mutable global objects (e.g. a dict of settings) and the functions used
+    through module attributes (e.g. mymodule.helper) are not part of
+    fingerprint. Pass a version to cache pipe to invalidate results when
+    they change.
+
+    :param pipe_obj: The Pipe object.
+    :type pipe_obj: Pipe
+    :returns: hex digest string.
+    :raises TypeError: If an argument or closure can't be represented stably.
+    """
+    h = hashlib.sha1()
+    _pipe_fingerprint(pipe_obj, h)
+    return h.hexdigest()
+
+
+#: In-memory tiers of cache pipe, indexed by (store, maxsize).
+_memory_caches = {}
+
+
+@pipe.func
+def cache(prev, sub_pipe, key=None, store=None, ttl=None, max_bytes=None, maxsize=1024, version=None):
+    """cache pipe memoizes the output of sub_pipe for each data from previous
+    pipe. The data is sent to sub_pipe alone and all output of sub_pipe is
+    cached. The cache key is made from the data (or key(data)) and the
+    fingerprint of sub_pipe.
+
+    There are two tiers of cache. The in-memory tier keeps at most maxsize
+    results. If store is specified, results are also pickled into files in
+    store directory, which are shared between processes and runs.
+
+    For example:
+
+    logs = readline('hosts.txt') | cache(fmt('ssh {} dmesg') | execmd, store='.cache')
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param sub_pipe: The pipe to be cached.
+    :type sub_pipe: Pipe
+    :param key: The function to make key from data. The key must be picklable.
+    :type key: function object
+    :param store: The directory of on-disk tier.
+    :type store: str
+    :param ttl: The seconds that a cached result is valid.
+    :type ttl: float
+    :param max_bytes: The maximum size of on-disk tier.
+    :type max_bytes: integer
+    :param maxsize: The maximum number of results in in-memory tier.
+    :type maxsize: integer
+    :param version: The token which is a part of cache key. Change it to
+                    invalidate results when things outside of fingerprint of
+                    sub_pipe are changed. Check fingerprint() for detail.
+    :type version: str
+    :returns: generator
+    """
+    if prev is None:
+        raise TypeError('cache must have input.')
+    memory_tier = _memory_caches.get((store, maxsize))
+    if memory_tier is None:
+        memory_tier = _memory_caches.setdefault((store, maxsize), LRUCache(maxsize))
+    disk_tier = DiskCache(store, max_bytes) if store is not None else None
+    pipe_fingerprint = fingerprint(sub_pipe)
+    if version is not None:
+        pipe_fingerprint += ':%s' % version
+
+    for data in prev:
+        h = hashlib.sha1(pipe_fingerprint.encode('utf-8'))
+        h.update(pickle.dumps(data if key is None else key(data), protocol=2))
+        cache_key = h.hexdigest()
+        now = time.time()
+
+        entry = memory_tier.get(cache_key)
+        if entry is None and disk_tier is not None:
+            entry = disk_tier.get(cache_key)
+            if entry is not None:
+                memory_tier.put(cache_key, entry)
+        if entry is not None and ttl is not None and entry[0] + ttl < now:
+            memory_tier.pop(cache_key)
+            if disk_tier is not None:
+                disk_tier.pop(cache_key)
+            entry = None
+
+        if entry is None:
+            entry = (now, list(seq([data, ]) | sub_pipe))
+            memory_tier.put(cache_key, entry)
+            if disk_tier is not None:
+                disk_tier.put(cache_key, entry)
+
+        for output in entry[1]:
+            yield output
+
+
+#: Memoized output of sh and execmd pipes.
+_command_memo = LRUCache(256)
+
+
+def _memo_command(memo, cmdline, stdin_data, capture_stderr, kw):
+    """Execute command line or get its memoized output.
+
+    :param memo: True to use default storage, or a LRUCache object.
+    :param cmdline: The command line to be executed.
+    :type cmdline: str
+    :param stdin_data: The data to be written to stdin of process.
+    :type stdin_data: bytes
+    :param capture_stderr: If true, stderr of process is captured.
+    :type capture_stderr: bool
+    :param kw: arguments for subprocess.Popen.
+    :type kw: dict
+    :returns: tuple of (stdout lines, stderr lines, returncode)
+    """
+    memo_store = _command_memo if memo is True else memo
+    env = kw.get('env')
+    key = (cmdline,
+           kw.get('cwd') or os.getcwd(),
+           tuple(sorted((os.environ if env is None else env).items())),
+           hashlib.sha1(stdin_data or b'').hexdigest(),
+           capture_stderr)
+    entry = memo_store.get(key)
+    if entry is None:
+        process = subprocess.Popen(cmdline, shell=True,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=None if not capture_stderr else subprocess.PIPE,
+            **kw)
+        out, err = process.communicate(stdin_data)
+        entry = (out.splitlines(True), err.splitlines(True) if err else [], process.returncode)
+        memo_store.put(key, entry)
+    return entry
+
+
+def clear_memo(cmdline=None, memo=None):
+    """Invalidate the memoized output of sh and execmd pipes.
+
+    :param cmdline: The command line to be invalidated. None means all.
+    :type cmdline: str
+    :param memo: The LRUCache object which passed to sh or execmd. None means the default one.
+    :type memo: LRUCache
+    """
+    memo_store = _command_memo if memo is None else memo
+    if cmdline is None:
+        memo_store.clear()
+        return
+    memo_store.pop_if(lambda key: key[0] == cmdline)
+
 #: alias of str.upper
 upper = pipe.map(lambda s, *args, **kw: s.upper(*args, **kw))
 #: alias of str.lower
@@ -767,7 +3083,9 @@ def safe_substitute(prev, *args, **kw):
 @pipe.func
 def to_str(prev, encoding=None):
     """Convert data from previous pipe with specified encoding."""
-    first = next(prev)
+    first = next(prev, _empty)
+    if first is _empty:
+        return
     if isinstance(first, str):
         if encoding is None:
             yield first
@@ -784,6 +3102,178 @@ def to_str(prev, encoding=None):
         for s in prev:
             yield s.decode(encoding)
 
+def _make_array(data, typecode):
+    """Make a NumPy array, or array.array if NumPy is not available."""
+    if numpy is not None:
+        return numpy.array(data, dtype=typecode)
+    return array.array(typecode, data)
+
+def _to_scalar(value):
+    """Convert NumPy scalar to Python object."""
+    return value.item() if hasattr(value, 'item') else value
+
+@pipe.func
+def to_array(prev, chunk=4096, typecode='d'):
+    """to_array pipe packs numeric data from previous pipe into contiguous
+    arrays of at most chunk items. The array is numpy.ndarray if NumPy is
+    installed. Otherwise, it is array.array.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param chunk: The maximum number of items in an array.
+    :type chunk: integer
+    :param typecode: The type code of array, e.g. 'd' for float, 'q' for int64.
+    :type typecode: str
+    :returns: generator
+    """
+    if prev is None:
+        raise TypeError('to_array must have input.')
+    for batch in batches(prev, chunk):
+        yield _make_array(batch, typecode)
+
+@pipe.func
+def vmap(prev, func, chunk=4096, typecode='d'):
+    """vmap pipe applies a ufunc-style function to numeric data. If NumPy is
+    installed, data is packed into arrays of at most chunk items and func is
+    called once per array. Otherwise, func is called once per data. Either
+    way, the result is sent to next pipe one by one.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param func: The function which takes array (or a number) and returns the same.
+    :type func: function object
+    :param chunk: The maximum number of items in an array.
+    :type chunk: integer
+    :param typecode: The type code of array.
+    :type typecode: str
+    :returns: generator
+    """
+    if prev is None:
+        raise TypeError('vmap must have input.')
+    if numpy is None:
+        for data in prev:
+            yield func(data)
+        return
+    for batch in batches(prev, chunk):
+        for data in numpy.asarray(func(numpy.array(batch, dtype=typecode))).tolist():
+            yield data
+
+@pipe.func
+def vfilter(prev, func, chunk=4096, typecode='d'):
+    """vfilter pipe filters numeric data with a ufunc-style function. If NumPy
+    is installed, func takes an array and returns a boolean mask. Otherwise,
+    func is called once per data and returns a boolean value.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param func: The function which returns the mask.
+    :type func: function object
+    :param chunk: The maximum number of items in an array.
+    :type chunk: integer
+    :param typecode: The type code of array.
+    :type typecode: str
+    :returns: generator
+    """
+    if prev is None:
+        raise TypeError('vfilter must have input.')
+    if numpy is None:
+        for data in prev:
+            if func(data):
+                yield data
+        return
+    for batch in batches(prev, chunk):
+        arr = numpy.array(batch, dtype=typecode)
+        for data in arr[numpy.asarray(func(arr), dtype=bool)].tolist():
+            yield data
+
+@pipe.func
+def vreduce(prev, func, chunk=4096, typecode='d', init=None):
+    """vreduce pipe reduces numeric data with a function like numpy.sum,
+    numpy.max or built-in sum and max. func is applied to each array (a list
+    if NumPy is not installed) of at most chunk items, and then applied again
+    to the partial results. So func must be associative. If there is no
+    data, init is sent to next pipe.
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param func: The function which reduces a sequence to a number.
+    :type func: function object
+    :param chunk: The maximum number of items in an array.
+    :type chunk: integer
+    :param typecode: The type code of array.
+    :type typecode: str
+    :param init: The result if there is no data.
+    :returns: generator
+    """
+    if prev is None:
+        raise TypeError('vreduce must have input.')
+    if numpy is None:
+        partials = [func(batch) for batch in batches(prev, chunk)]
+    else:
+        partials = [func(numpy.array(batch, dtype=typecode)) for batch in batches(prev, chunk)]
+    if not partials:
+        yield init
+        return
+    # The partial results may not fit in typecode, e.g. the sum of int16
+    # data, so their type is inferred instead.
+    if numpy is not None:
+        partials = numpy.array(partials)
+    yield _to_scalar(func(partials))
+
+
+@pipe.func
+def columns(prev, sep=None, usecols=None, dtypes='d', chunk=4096):
+    """columns pipe parses delimited lines from previous pipe into typed
+    column arrays. Lines are parsed in blocks of at most chunk lines, and a
+    tuple of column arrays is sent to next pipe for each block. The arrays
+    are numpy.ndarray if NumPy is installed, the lines are parsed by NumPy's
+    parser without creating Python objects per field. Otherwise, they are
+    array.array.
+
+    For example:
+
+    for latency, size in readline('access.log') | columns(usecols=(3, 5), dtypes=('d', 'q')):
+        ...
+
+    :param prev: The previous iterator of pipe.
+    :type prev: Pipe
+    :param sep: The delimiter of fields. None means whitespaces.
+    :type sep: str
+    :param usecols: The indexes of columns to be extracted. None means all.
+    :type usecols: list of integer
+    :param dtypes: The type code of all columns, or a list of type codes for each column.
+    :type dtypes: str|list of str
+    :param chunk: The maximum number of lines to be parsed in a block.
+    :type chunk: integer
+    :returns: generator
+    """
+    if prev is None:
+        raise TypeError('columns must have input.')
+    if usecols is not None and not is_str_type(dtypes) and len(dtypes) != len(usecols):
+        raise ValueError('The number of dtypes and usecols must be the same.')
+    # Blank lines are skipped, as numpy.loadtxt does.
+    lines = (line for line in prev if line.strip())
+    for batch in batches(lines, chunk):
+        if usecols is None:
+            usecols = tuple(range(len(batch[0].split(sep))))
+            if not is_str_type(dtypes) and len(dtypes) != len(usecols):
+                raise ValueError('The number of dtypes and columns must be the same.')
+        if is_str_type(dtypes):
+            dtypes = (dtypes, ) * len(usecols)
+
+        if numpy is not None:
+            dtype = numpy.dtype([('f%d' % i, tc) for i, tc in enumerate(dtypes)])
+            records = numpy.loadtxt(batch, delimiter=sep, usecols=usecols,
+                                    dtype=dtype, comments=None, ndmin=1)
+            yield tuple(numpy.ascontiguousarray(records['f%d' % i]) for i in range(len(dtypes)))
+        else:
+            rows = [line.split(sep) for line in batch]
+            cols = []
+            for col, tc in zip(usecols, dtypes):
+                conv = float if tc in 'fd' else int
+                cols.append(array.array(tc, [conv(row[col]) for row in rows]))
+            yield tuple(cols)
+
 def register_default_types():
     """Regiser all default type-to-pipe convertors."""
     register_type(type, pipe.map)
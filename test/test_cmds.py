@@ -3,6 +3,7 @@
 
 import sys
 import os
+import operator
 from cmdlet import *
 from cmdlet.cmds import *
 
@@ -577,3 +578,669 @@ def test_to_str_cmd():
     cmd2 = zen_of_python | to_str
     for i, v in enumerate(cmd2):
         assert v == zen_of_python[i].encode('utf-8').decode('utf-8')
+
+
+def test_walk_index_cmd():
+    import tempfile
+    import shutil
+
+    root = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(root, 'a', 'b'))
+        for name in ('x.txt', os.path.join('a', 'y.txt'), os.path.join('a', 'b', 'z.txt')):
+            open(os.path.join(root, name), 'w').close()
+        index_file = os.path.join(root, 'walk.idx')
+
+        def os_walk_files():
+            files = set()
+            for dir_path, dir_names, filenames in os.walk(root):
+                for filename in filenames:
+                    files.add(os.path.join(dir_path, filename))
+            return files
+
+        cmd1 = walk(root, index=index_file)
+        files = set(cmd1.result())
+        assert os.path.exists(index_file)
+        assert files | set([index_file]) == os_walk_files()
+
+        files = set(cmd1.result())
+        assert files == os_walk_files()
+
+        os.remove(os.path.join(root, 'a', 'y.txt'))
+        open(os.path.join(root, 'a', 'b', 'w.txt'), 'w').close()
+        files = set(cmd1.result())
+        assert files == os_walk_files()
+    finally:
+        shutil.rmtree(root)
+
+
+read_files = []
+
+def test_incremental_cmd():
+    import tempfile
+    import shutil
+
+    root = tempfile.mkdtemp()
+    try:
+        filenames = [os.path.join(root, 'log%d.txt' % i) for i in range(3)]
+        for i, filename in enumerate(filenames):
+            with open(filename, 'w') as fd:
+                fd.write('line%d\n' % i)
+        manifest = os.path.join(root, 'manifest')
+        del read_files[:]
+
+        @pipe.func
+        def read_and_log(prev):
+            for filename in prev:
+                read_files.append(filename)
+                for line in open(filename):
+                    yield line.rstrip()
+
+        cmd1 = filenames | incremental(read_and_log, manifest)
+        assert cmd1.result() == ['line0', 'line1', 'line2']
+        assert read_files == filenames
+
+        del read_files[:]
+        assert cmd1.result() == ['line0', 'line1', 'line2']
+        assert read_files == []
+
+        with open(filenames[1], 'a') as fd:
+            fd.write('more\n')
+        assert cmd1.result() == ['line0', 'line1', 'more', 'line2']
+        assert read_files == [filenames[1]]
+
+        del read_files[:]
+        cmd2 = filenames | incremental(read_and_log, manifest, replay=False)
+        assert cmd2.result() == []
+        assert read_files == []
+
+        cmd3 = filenames[:1] | incremental(read_and_log | grep('line'), manifest)
+        assert cmd3.result() == ['line0']
+        cmd4 = filenames[:1] | incremental(read_and_log | grep('more'), manifest)
+        assert cmd4.result() == []
+
+        out_name = os.path.join(root, 'out.txt')
+        with open(out_name, 'w') as out:
+            cmd5 = filenames[:1] | incremental(readline | fileobj(out, thru=True), manifest, version='v1')
+            assert cmd5.result() == ['line0']
+            del read_files[:]
+            cmd6 = filenames[:1] | incremental(read_and_log, manifest, version='v1')
+            assert cmd6.result() == ['line0']
+            assert cmd6.result() == ['line0']
+            assert len(read_files) == 1
+            cmd7 = filenames[:1] | incremental(read_and_log, manifest, version='v2')
+            assert cmd7.result() == ['line0']
+            assert len(read_files) == 2
+    finally:
+        shutil.rmtree(root)
+
+
+cache_calls = []
+
+def test_cache_cmd():
+    import tempfile
+    import shutil
+
+    @pipe.map
+    def slow_square(x):
+        cache_calls.append(x)
+        return x * x
+
+    cmd1 = [1, 2, 3, 2, 1] | cache(slow_square)
+    assert cmd1.result() == [1, 4, 9, 4, 1]
+    assert cache_calls == [1, 2, 3]
+
+    del cache_calls[:]
+    cmd2 = [1, 2, 3] | cache(slow_square | pipe.map(lambda x: x + 1))
+    assert cmd2.result() == [2, 5, 10]
+    assert cache_calls == [1, 2, 3]
+
+    store = tempfile.mkdtemp()
+    try:
+        del cache_calls[:]
+        cmd3 = [1, 2, 3] | cache(slow_square, store=store, key=str)
+        assert cmd3.result() == [1, 4, 9]
+        assert cache_calls == [1, 2, 3]
+        cmds._memory_caches.clear()
+        assert cmd3.result() == [1, 4, 9]
+        assert cache_calls == [1, 2, 3]
+
+        cmd4 = range(100) | cache(slow_square, store=store, max_bytes=2048)
+        cmd4.run()
+        cache_size = sum(os.path.getsize(os.path.join(store, fn)) for fn in os.listdir(store))
+        assert cache_size <= 2048
+
+        del cache_calls[:]
+        cmd5 = [7, 7] | cache(slow_square, ttl=-1)
+        assert cmd5.result() == [49, 49]
+        assert cache_calls == [7, 7]
+    finally:
+        shutil.rmtree(store)
+
+    del cache_calls[:]
+    cmd6 = [1, 2, 3, 1] | cache(slow_square, maxsize=2)
+    assert cmd6.result() == [1, 4, 9, 1]
+    assert cache_calls == [1, 2, 3, 1]
+    assert cmds._memory_caches[(None, 2)].maxsize == 2
+
+
+def test_fingerprint_cmd():
+    import functools
+    import subprocess
+
+    script = ('import functools, operator; from cmdlet.cmds import *; '
+              'print(fingerprint(pipe.map(functools.partial(operator.add, 1)) | tee(counter, uniq | counter) | upper))')
+    fp1 = subprocess.check_output([sys.executable, '-c', script]).decode().strip()
+    fp2 = subprocess.check_output([sys.executable, '-c', script]).decode().strip()
+    assert fp1 == fp2
+
+    add_one = pipe.map(functools.partial(operator.add, 1))
+    assert fingerprint(add_one) != fingerprint(pipe.map(functools.partial(operator.add, 2)))
+
+    class Unpicklable(object):
+        def __reduce__(self):
+            raise TypeError('unpicklable')
+
+    try:
+        fingerprint(pipe.map(lambda x: x) | fmt(Unpicklable()))
+        assert False
+    except TypeError:
+        pass
+
+    global fingerprint_threshold, fingerprint_helper
+    over_threshold = pipe.filter(lambda x: fingerprint_helper(x) > fingerprint_threshold)
+    fingerprint_threshold = 5
+    fingerprint_helper = lambda x: x
+    fp1 = fingerprint(over_threshold)
+    assert fp1 == fingerprint(over_threshold)
+    fingerprint_threshold = 50
+    fp2 = fingerprint(over_threshold)
+    assert fp2 != fp1
+    fingerprint_helper = lambda x: x * 2
+    assert fingerprint(over_threshold) != fp2
+
+    del cache_calls[:]
+    square = pipe.map(lambda x: cache_calls.append(x) or x * x)
+    assert ([3] | cache(square, version='v1')).result() == [9]
+    assert ([3] | cache(square, version='v1')).result() == [9]
+    assert ([3] | cache(square, version='v2')).result() == [9]
+    assert cache_calls == [3, 3]
+
+
+def test_vector_cmd():
+    import array
+    import math
+
+    saved_numpy = cmds.numpy
+    try:
+        for numpy_module in (saved_numpy, None):
+            cmds.numpy = numpy_module
+            data = [float(i) for i in range(1000)]
+
+            arrays = result(data | to_array(chunk=300))
+            assert [len(a) for a in arrays] == [300, 300, 300, 100]
+            if numpy_module is None:
+                assert isinstance(arrays[0], array.array)
+            assert list(arrays[-1]) == data[900:]
+
+            sqrt = numpy_module.sqrt if numpy_module is not None else math.sqrt
+            assert result(data | vmap(sqrt, chunk=128)) == [math.sqrt(i) for i in data]
+            assert result(data | vmap(lambda x: x * 2 + 1)) == [i * 2 + 1 for i in data]
+
+            assert result(data | vfilter(lambda x: x > 990.0, chunk=7)) == data[991:]
+
+            assert run(data | vreduce(sum, chunk=64)) == sum(data)
+            assert run(data | vreduce(max, chunk=64)) == 999.0
+            assert run(range(10) | vreduce(sum, typecode='q')) == 45
+            assert run([] | vreduce(max)) is None
+            vsum = numpy_module.sum if numpy_module is not None else sum
+            assert run([100] * 10000 | vreduce(vsum, typecode='h')) == 1000000
+            assert run([] | vreduce(max, init=0.0)) == 0.0
+
+            for cmd in (to_array, vmap(sqrt), vfilter(sqrt), vreduce(sum), columns):
+                try:
+                    cmd.run()
+                    assert False
+                except TypeError as e:
+                    assert e.args[0].endswith('must have input.')
+    finally:
+        cmds.numpy = saved_numpy
+
+
+def test_columns_cmd():
+    lines = ['%d, %f, name%d, %d' % (i, i / 4.0, i, i * 1000) for i in range(10)]
+
+    saved_numpy = cmds.numpy
+    try:
+        for numpy_module in (saved_numpy, None):
+            cmds.numpy = numpy_module
+
+            blocks = result(lines | columns(sep=',', usecols=(0, 1, 3), dtypes=('q', 'd', 'q'), chunk=4))
+            assert len(blocks) == 3
+            ids = [v for block in blocks for v in block[0]]
+            ratios = [v for block in blocks for v in block[1]]
+            sizes = [v for block in blocks for v in block[2]]
+            assert ids == list(range(10))
+            assert ratios == [i / 4.0 for i in range(10)]
+            assert sizes == [i * 1000 for i in range(10)]
+
+            blocks = result(['1 2', '3 4'] | columns)
+            assert len(blocks) == 1
+            assert [list(col) for col in blocks[0]] == [[1.0, 3.0], [2.0, 4.0]]
+
+            blocks = result(['1 2', '', '  \n', '3 4\n'] | columns(chunk=2))
+            assert [list(col) for col in blocks[0]] == [[1.0, 3.0], [2.0, 4.0]]
+            assert result(['', ''] | columns) == []
+
+            try:
+                result(lines | columns(sep=',', usecols=(0, 3), dtypes=('q', )))
+                assert False
+            except ValueError:
+                pass
+    finally:
+        cmds.numpy = saved_numpy
+
+
+def test_csv_jsonl_cmd():
+    import tempfile
+    import shutil
+
+    root = tempfile.mkdtemp()
+    try:
+        rows = [{'name': 'Gary', 'note': 'a, "quoted" note'},
+                {'name': 'Mary', 'note': 'multi\nline'}]
+        csv_file = os.path.join(root, 'people.csv')
+        cmd1 = rows | csv_write(csv_file, thru=True)
+        assert cmd1.result() == rows
+
+        assert result(csv_read(csv_file, header=True)) == rows
+        assert result(csv_read(csv_file)) == [['name', 'note']] + [[r['name'], r['note']] for r in rows]
+
+        tsv_file = os.path.join(root, 'people.tsv')
+        run([('1', 'x'), ('2', 'y')] | csv_write(tsv_file, header=['id', 'value'], delimiter='\t'))
+        cmd2 = readline(tsv_file) | csv_read(header=['id', 'value'], delimiter='\t')
+        assert cmd2.result() == [{'id': 'id', 'value': 'value'}, {'id': '1', 'value': 'x'}, {'id': '2', 'value': 'y'}]
+
+        lines = ['%d,item%d' % (i, i) for i in range(100)]
+        cmd3 = lines | csv_read(workers=2, chunk=7)
+        assert cmd3.result() == [[str(i), 'item%d' % i] for i in range(100)]
+
+        records = [{'id': i, 'tags': ['t%d' % i], 'name': u'né%d' % i} for i in range(50)]
+        jsonl_file = os.path.join(root, 'records.jsonl')
+        run(records | jsonl_write(jsonl_file, chunk=8))
+        assert result(jsonl_read(jsonl_file)) == records
+        assert result(readline(jsonl_file) | jsonl_read(workers=2, chunk=8)) == records
+        assert result(['{"a": 1}', '', '[2]'] | jsonl_read) == [{'a': 1}, [2]]
+        try:
+            result(['{"a": 1}'] * 20 + ['{broken'] | jsonl_read(workers=2, chunk=4))
+            assert False
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(root)
+
+
+def test_record_cmd():
+    pattern = r'''name=(?P<name>\w+)\s*,\s*gender=(\w+)\s*,\s*age=(?P<age>\d+).*'''
+    test_vector = ['name=Gary, gender=man, age=30', 'name=Mary, gender=woman, age=35']
+    records = result(test_vector | match(pattern, to='record'))
+    assert records[0].name == 'Gary' and records[0].group2 == 'man' and records[0].age == '30'
+    assert records[1] == ('Mary', 'woman', '35')
+    assert type(records[0]) is type(records[1])
+    assert record_type(('name', 'group2', 'age')) is type(records[0])
+
+    dicts = [dict(item_i=i, item_j=i * 10) for i in range(5)]
+    records = result(dicts | values('item_j', 'item_i', 'missing', to='record'))
+    assert [(r.item_j, r.item_i, r.missing) for r in records] == [(i * 10, i, None) for i in range(5)]
+
+    records = result([[1, 2, 3], [4, 5]] | values(2, 0, to='record'))
+    assert records == [(3, 1), (None, 4)]
+    assert records[0]._fields == ('_0', '_1')
+
+    class TestClass(object):
+        def __init__(self, i):
+            self.attr0 = i
+            self.attr1 = i * 2
+
+    objs = [TestClass(i) for i in range(3)]
+    records = result(objs | attrdict(['attr0', 'attr1', 'attr2'], to='record'))
+    assert [(r.attr0, r.attr1, r.attr2) for r in records] == [(i, i * 2, None) for i in range(3)]
+    records = result(objs | attrdict(dict(attr1=None, attr2=-1), to='record'))
+    assert [tuple(r) for r in records] == [(i * 2, -1) for i in range(3)]
+
+
+def test_accessor_fallback_cmd():
+    import collections
+
+    class Full(object):
+        a, b, c = 1, 2, 3
+
+    class Partial(object):
+        a, c = 10, 30
+
+    objs = [Full(), Partial(), Full()]
+    assert result(objs | attr('b')) == [2, 2]
+    assert result(objs | attrs(['a', 'b', 'c'])) == [[1, 2, 3], [10, 30], [1, 2, 3]]
+    assert result(objs | attrs(['c'])) == [[3], [30], [3]]
+    assert result(objs | attrdict(['a', 'b'])) == [dict(a=1, b=2), dict(a=10), dict(a=1, b=2)]
+    assert result(objs | attrdict(dict(b=-1, c=-1))) == [dict(b=2, c=3), dict(b=-1, c=30), dict(b=2, c=3)]
+
+    nested = Full()
+    nested.b = Partial()
+    assert result([nested] | attr('b.c')) == []
+    assert result([nested] | attrs(['a', 'b.c'])) == [[1]]
+    assert result([nested] | attrdict(['a', 'b.c'])) == [dict(a=1)]
+
+    dicts = [dict(x=1, y=2), dict(x=3), dict(y=4, x=5)]
+    assert result(dicts | values('x', 'y')) == [[1, 2], [3], [5, 4]]
+    assert result(dicts | values('y')) == [[2], [], [4]]
+
+    default_dicts = [collections.defaultdict(int, x=1)]
+    assert result(default_dicts | values('x', 'y')) == [[1]]
+    mixed = [dict(x=1), collections.defaultdict(list)]
+    assert result(mixed | values('x', 'y')) == [[1], []]
+    assert dict(mixed[1]) == {}
+
+    lists = [[1, 2, 3], [4], [5, 6, 7]]
+    assert result(lists | values(0, 2)) == [[1, 3], [4], [5, 7]]
+    assert result(lists | values(-1, 0)) == [[1], [4], [5]]
+
+
+def test_flatten_atomic_cmd():
+    assert result(['abc', ['de', ('f', b'gh')]] | flatten) == ['abc', 'de', 'f', b'gh']
+    assert result([{'k': 1}, [{'j': 2}]] | flatten(atomic=(dict, ))) == [{'k': 1}, {'j': 2}]
+    assert result([['ab', {'k': 1}], b'c'] | flatten(atomic=(dict, ))) == ['ab', {'k': 1}, b'c']
+    assert result([[1, [2]], 3, [[4]]] | flatten(1)) == [1, [2], 3, [4]]
+    assert result([[1, [2]], 3] | flatten(0)) == [[1, [2]], 3]
+
+    deep = [0]
+    for i in range(sys.getrecursionlimit() * 2):
+        deep = [deep]
+    assert result([deep] | flatten) == [0]
+
+
+def test_sort_cmd():
+    import random
+
+    rnd = random.Random(1)
+    test_vector = [rnd.randint(0, 100) for i in range(5000)]
+    assert result(test_vector | sort) == sorted(test_vector)
+    assert result(test_vector | sort(reverse=True, memory_limit=4096)) == sorted(test_vector, reverse=True)
+
+    pairs = [(rnd.randint(0, 10), i) for i in range(5000)]
+    cmd = pairs | sort(key=lambda p: p[0], memory_limit=4096)
+    assert cmd.result() == sorted(pairs, key=lambda p: p[0])
+
+    assert result([] | sort) == []
+
+
+def test_groupby_cmd():
+    import random
+
+    rnd = random.Random(2)
+    test_vector = [('k%d' % rnd.randint(0, 50), rnd.randint(1, 100)) for i in range(3000)]
+    expected = {}
+    for k, v in test_vector:
+        expected.setdefault(k, []).append(v)
+
+    cmd1 = test_vector | groupby(lambda d: d[0])
+    assert dict(cmd1.result()) == dict((k, len(v)) for k, v in expected.items())
+
+    aggs = ['count', 'sum', 'min', 'max', 'mean', 'collect']
+    for max_keys in (None, 10):
+        cmd2 = test_vector | groupby(lambda d: d[0], aggs, value=lambda d: d[1], max_keys=max_keys, partitions=4)
+        ans = dict(cmd2.result())
+        assert len(ans) == len(expected)
+        for k, v in expected.items():
+            count, total, low, high, mean, collected = ans[k]
+            assert (count, total, low, high) == (len(v), sum(v), min(v), max(v))
+            assert abs(mean - sum(v) / float(len(v))) < 1e-9
+            assert sorted(collected) == sorted(v)
+
+
+def test_uniq_cmd():
+    test_vector = [3, 1, 3, 2, 1, 4, 2, 5]
+    assert result(test_vector | uniq) == [3, 1, 2, 4, 5]
+    assert result(test_vector | uniq(mode='lru', capacity=2)) == [3, 1, 2, 1, 4, 2, 5]
+    assert result(test_vector | uniq(mode='bloom', capacity=100)) == [3, 1, 2, 4, 5]
+    assert result(['a', 'A', 'b'] | uniq(key=str.lower)) == ['a', 'b']
+    assert result([1, '1', b'1'] | uniq(mode='bloom', capacity=100)) == [1, '1', b'1']
+    mixed = [1, 1.0, True, 0.0, -0.0, (1, 2.0), (1.0, 2), frozenset(['a', 1]), frozenset([1.0, 'a'])]
+    for mode in ('exact', 'lru', 'bloom'):
+        assert result(mixed | uniq(mode=mode, capacity=100)) == [1, 0.0, (1, 2.0), frozenset(['a', 1])]
+
+    num = 20000
+    passed = run(range(num) | uniq(mode='bloom', capacity=num, error_rate=0.01) | counter)
+    assert passed > num * 0.97
+
+    try:
+        run(test_vector | uniq(mode='unknown'))
+        assert False
+    except ValueError:
+        pass
+
+
+def test_sketch_cmd():
+    import random
+
+    num = 50000
+    estimate = run(range(num) | pipe.map(lambda i: i % 20000) | approx_distinct)
+    assert abs(estimate - 20000) < 20000 * 0.05
+    assert abs(run(range(100) | approx_distinct) - 100) <= 2
+
+    hll1 = run(range(0, 30000) | approx_distinct(sketch=True))
+    hll2 = run(range(20000, 50000) | approx_distinct(sketch=True))
+    hll1.merge(hll2)
+    assert abs(hll1.cardinality() - 50000) < 50000 * 0.05
+
+    rnd = random.Random(3)
+    test_vector = [rnd.random() for i in range(num)]
+    q50, q90, q99 = run(test_vector | approx_quantiles(seed=1))
+    assert abs(q50 - 0.5) < 0.05 and abs(q90 - 0.9) < 0.05 and abs(q99 - 0.99) < 0.05
+
+    kll1 = run(test_vector[:num // 2] | approx_quantiles(sketch=True, seed=1))
+    kll2 = run(test_vector[num // 2:] | approx_quantiles(sketch=True, seed=2))
+    kll1.merge(kll2)
+    assert kll1.count == num
+    assert abs(kll1.quantiles([0.5])[0] - 0.5) < 0.05
+
+    words = ['a'] * 500 + ['b'] * 300 + ['c'] * 200 + ['w%d' % i for i in range(3000)]
+    rnd.shuffle(words)
+    top = run(words | heavy_hitters(3, capacity=200))
+    assert [k for k, count in top] == ['a', 'b', 'c']
+    assert top[0][1] >= 500
+
+    ss1 = run(words[:2000] | heavy_hitters(sketch=True, capacity=200))
+    ss2 = run(words[2000:] | heavy_hitters(sketch=True, capacity=200))
+    ss1.merge(ss2)
+    assert [k for k, count in ss1.top(3)] == ['a', 'b', 'c']
+
+
+def test_topk_sample_cmd():
+    import random
+
+    rnd = random.Random(4)
+    test_vector = [rnd.randint(0, 10000) for i in range(5000)]
+    assert run(test_vector | topk(10)) == sorted(test_vector, reverse=True)[:10]
+    assert run(test_vector | topk(5, smallest=True)) == sorted(test_vector)[:5]
+    assert run(test_vector | topk(3, key=lambda x: -x)) == sorted(test_vector)[:3]
+
+    picked = run(range(1000) | sample(10, seed=1))
+    assert len(picked) == 10 and len(set(picked)) == 10
+    assert picked == run(range(1000) | sample(10, seed=1))
+    assert sorted(run(range(5) | sample(10))) == list(range(5))
+    assert run(range(5) | sample(0)) == []
+    assert run(range(5) | sample(0, weight=lambda i: 1)) == []
+
+    class ZeroRandom(random.Random):
+        def random(self):
+            return 0.0
+
+    saved_random = cmds.random.Random
+    cmds.random.Random = ZeroRandom
+    try:
+        assert len(run(range(100) | sample(3))) == 3
+    finally:
+        cmds.random.Random = saved_random
+
+    counts = [0] * 10
+    for seed in range(2000):
+        for i in run(range(10) | sample(1, seed=seed)):
+            counts[i] += 1
+    assert min(counts) > 100
+
+    heavy = 0
+    for seed in range(500):
+        picked = run(range(10) | sample(1, seed=seed, weight=lambda i: 91 if i == 0 else 1))
+        heavy += picked == [0]
+    assert heavy > 400
+
+
+def test_window_cmd():
+    import random
+
+    assert result(range(10) | window(3)) == [(0, 3), (3, 3), (6, 3)]
+    assert result(range(10) | window(3, rest=True)) == [(0, 3), (3, 3), (6, 3), (9, 1)]
+    assert result(range(6) | window(2, step=3, agg='sum')) == [(0, 1), (3, 7)]
+
+    rnd = random.Random(5)
+    test_vector = [rnd.randint(-100, 100) for i in range(500)]
+    aggs = ['count', 'sum', 'mean', 'min', 'max']
+    ans = result(test_vector | window(50, step=7, agg=aggs))
+    assert len(ans) == (500 - 50) // 7 + 1
+    for start, (count, total, mean, low, high) in ans:
+        w = test_vector[start:start + 50]
+        assert (count, total, low, high) == (len(w), sum(w), min(w), max(w))
+        assert abs(mean - sum(w) / 50.0) < 1e-9
+
+    events = [(0.5, 1), (1.2, 2), (1.9, 3), (4.1, 4), (4.2, 5), (9.0, 6)]
+    cmd = events | window(2, step=1, by='time', time_key=lambda e: e[0], agg=['count', 'max'], value=lambda e: e[1])
+    assert cmd.result() == [
+        (-1, (1, 1)), (0, (3, 3)), (1, (2, 3)),
+        (3, (2, 5)), (4, (2, 5)),
+        (8, (1, 6)), (9, (1, 6)),
+    ]
+
+
+def test_hashjoin_cmd():
+    hosts = [('h1', 'web'), ('h2', 'db'), ('h2', 'cache')]
+    logs = [('h1', 200), ('h3', 404), ('h2', 500)]
+
+    cmd1 = logs | hashjoin(hosts, key=lambda r: r[0])
+    assert cmd1.result() == [(('h1', 200), ('h1', 'web')), (('h2', 500), ('h2', 'db')), (('h2', 500), ('h2', 'cache'))]
+
+    cmd2 = logs | hashjoin(seq(hosts), key=lambda r: r[0], how='left')
+    assert cmd2.result()[1] == (('h3', 404), None)
+    assert len(cmd2.result()) == 4
+
+    users = [dict(id=i, name='user%d' % i) for i in range(200)]
+    events = [(i % 250, 'event%d' % i) for i in range(1000)]
+    expected = sorted((e, u) for e in events for u in users if u['id'] == e[0])
+    for max_rows in (None, 20):
+        cmd3 = events | hashjoin(users, key=lambda e: e[0], other_key=lambda u: u['id'], max_rows=max_rows, partitions=4)
+        assert sorted(cmd3.result(), key=lambda p: p[0]) == expected
+        cmd4 = events | hashjoin(users, key=lambda e: e[0], other_key=lambda u: u['id'], how='left', max_rows=max_rows)
+        assert len(cmd4.result()) == 1000
+
+
+def test_merge_cmd():
+    a = [1, 4, 7, 10]
+    b = [2, 5, 8]
+    c = seq([3, 6, 9])
+    assert merge(a, b, c).result() == list(range(1, 11))
+    assert merge(a, b, c, prefetch=2).result() == list(range(1, 11))
+    assert merge(a[::-1], b[::-1], reverse=True).result() == [10, 8, 7, 5, 4, 2, 1]
+
+    logs = [[('00:01', 'a'), ('00:03', 'a')], [('00:02', 'b')]]
+    assert merge(*logs, key=lambda r: r[0]).result() == [('00:01', 'a'), ('00:02', 'b'), ('00:03', 'a')]
+
+    def broken():
+        yield 1
+        raise ValueError('broken source')
+
+    try:
+        merge(a, broken(), prefetch=1).run()
+        assert False
+    except ValueError:
+        pass
+
+    cmd = merge(range(0, 100000, 2), range(1, 100000, 2), prefetch=4)
+    assert (cmd | counter).run() == 100000
+
+
+def test_tee_cmd():
+    data = list(range(10000))
+    for threads in (False, True):
+        count, top, evens = (data | tee(counter, topk(3), pipe.filter(lambda x: x % 2 == 0) | counter, threads=threads, buffer_size=2)).run()
+        assert count == [10000]
+        assert top == [[9999, 9998, 9997]]
+        assert evens == [5000]
+
+    calls = []
+    source = seq(data) | pipe.map(lambda x: calls.append(x) or x)
+    assert (source | tee(counter, counter, threads=True)).run() == ([10000], [10000])
+    assert len(calls) == 10000
+
+    def broken(prev):
+        for i in prev:
+            if i == 500:
+                raise ValueError('broken branch')
+            yield i
+
+    try:
+        (data | tee(counter, pipe.func(broken), threads=True)).run()
+        assert False
+    except ValueError:
+        pass
+
+
+def test_partition_cmd():
+    data = [('k%d' % (i % 50), i) for i in range(20000)]
+    expected = {}
+    for k, v in data:
+        expected[k] = expected.get(k, 0) + v
+
+    sub = groupby(lambda r: r[0], 'sum', value=lambda r: r[1])
+    cmd = data | partition(key=lambda r: r[0], workers=3, sub=sub, chunk_size=100)
+    assert dict(cmd.result()) == expected
+
+    cmd = data | partition(key=lambda r: r[0], workers=2, sub=pipe.map(lambda r: r[0]) | uniq)
+    assert sorted(cmd.result()) == sorted(expected)
+
+    def broken(prev):
+        for data in prev:
+            if data[1] == 5000:
+                raise ValueError('broken worker')
+            yield data
+
+    try:
+        (data | partition(key=lambda r: r[0], workers=2, sub=pipe.func(broken))).run()
+        assert False
+    except ValueError:
+        pass
+
+
+def test_parallel_cmd():
+    data = list(range(20000))
+    sub = pipe.map(lambda x: x * 3) | pipe.filter(lambda x: x % 2 == 0)
+    expected = sub.compile().result(data)
+
+    for serializer in ('pickle', 'marshal'):
+        stats = {}
+        cmd = data | parallel(sub, workers=3, chunk_size=100, serializer=serializer, stats=stats)
+        assert cmd.result() == expected
+        assert sorted(stats) == [0, 1, 2]
+        assert sum(s['items'] for s in stats.values()) == len(data)
+
+    cmd = data | parallel(sub, workers=2, ordered=False)
+    assert sorted(cmd.result()) == expected
+
+    rows = [dict(id=i, tags=set([i % 3])) for i in range(100)]
+    cmd = rows | parallel(pipe.map(lambda r: r['tags']), workers=2, chunk_size=7, serializer='marshal')
+    assert cmd.result() == [r['tags'] for r in rows]
+
+    try:
+        (data | parallel(pipe.map(lambda x: 1 // (x - 5000)), workers=2)).run()
+        assert False
+    except ZeroDivisionError:
+        pass
@@ -6,6 +6,7 @@ def test_cmdlet_import():
 
     match_names = [
         'Pipe',
+        'CompiledPipe',
         'PipeFunction',
         'UnregisteredPipeType',
         'register_type',
@@ -13,6 +14,7 @@ def test_cmdlet_import():
         'unregister_all_types',
         'has_registered_type',
         'get_item_creator',
+        'batches',
         'cmds',
     ]
 
@@ -221,3 +221,113 @@ def test_pipe_type_registration():
     unregister_type(list)
     unregister_type(list)
     assert not has_registered_type(list)
+
+def test_pipe_compile():
+    register_default_types()
+
+    @pipe.filter
+    def low_pass(data, threshold):
+        return data <= threshold
+
+    cmd = low_pass(10) | pipe.map(lambda x: x * 2)
+    runner = cmd.compile()
+    assert runner.result(range(100)) == [i * 2 for i in range(11)]
+    assert runner.run(range(5)) == 8
+    assert list(runner(seq([1, 20, 3]))) == [2, 6]
+    assert list(runner(iter([4, 40]))) == [8]
+
+    # Changing the pipe doesn't affect the compiled one.
+    cmd = cmd | str
+    assert runner.result([1]) == [2]
+    assert (range(3) | cmd).result() == ['0', '2', '4']
+
+    try:
+        runner.stages = ()
+        assert False
+    except AttributeError:
+        pass
+
+    source_runner = (seq([1, 2, 3]) | pipe.map(lambda x: -x)).compile()
+    assert source_runner.result() == [-1, -2, -3]
+    assert source_runner.result() == [-1, -2, -3]
+
+def test_pipe_thread_safety():
+    import threading
+    register_default_types()
+
+    shared_stage = pipe.map(lambda x: [x])
+    shared = pipe.filter(lambda x: x % 3 == 0) | pipe.map(lambda x: x + 1) | shared_stage | values(0)
+    expected = [[i + 1] for i in range(0, 1000, 3)]
+    errors = []
+
+    def worker():
+        try:
+            for i in range(20):
+                assert list(range(1000) | pipe.map(int) | shared) == expected
+                assert (range(1000) | shared_stage | flatten | shared).result() == expected
+                assert shared.compile().result(range(1000)) == expected
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert shared_stage.next is None and not shared_stage.chained
+
+    assert ([] | values(0)).result() == []
+    assert ([] | to_str).result() == []
+
+def test_pipe_batch():
+    register_default_types()
+
+    batch_sizes = []
+
+    @pipe.batch_map
+    def double(batch, offset=0):
+        batch_sizes.append(len(batch))
+        return [i * 2 + offset for i in batch]
+
+    ans = result(range(2500) | double)
+    assert ans == [i * 2 for i in range(2500)]
+    assert batch_sizes == [1024, 1024, 452]
+
+    ans = result(range(10) | double(offset=1))
+    assert ans == [i * 2 + 1 for i in range(10)]
+
+    small_batch = pipe.batch_map(lambda batch: [sum(batch)], 3)
+    assert result(range(7) | small_batch) == [3, 12, 6]
+
+    even = pipe.batch_filter(lambda batch: [i % 2 == 0 for i in batch], 4)
+    assert result(range(10) | even) == [0, 2, 4, 6, 8]
+
+    cmd = double | str
+    try:
+        cmd.run()
+        assert False
+    except TypeError as e:
+        assert e.args[0] == 'A batch mapper must have input.'
+
+
+def test_pipe_parallel_reduce():
+    import collections
+    data = list(range(100000))
+
+    for processes in (False, True):
+        total = pipe.reduce(lambda x, acc: x + acc, associative=True, workers=3, chunk_size=1000, processes=processes)
+        assert (data | total(init=0)).run() == sum(data)
+        assert ([] | total(init=0)).run() == 0
+
+    def count(x, acc):
+        acc[x % 7] += 1
+        return acc
+
+    counts = pipe.reduce(count, associative=True, combine=lambda a, b: a + b, workers=4, chunk_size=777)
+    assert (data | counts(init=collections.Counter())).run() == collections.Counter(x % 7 for x in data)
+
+    for processes in (False, True):
+        concat = pipe.reduce(lambda x, acc: acc + str(x), associative=True, workers=2, chunk_size=3,
+                             combine=lambda a, b: a + b, processes=processes)
+        assert (list(range(20)) | concat(init='')).run() == ''.join(str(x) for x in range(20))
@@ -56,3 +56,50 @@ def test_sh_without_cmd():
     cmd2 = sh | stop_if_large_than(10)
     s = cmd2.run()
     assert s == 10
+
+def test_sh_memo():
+    register_default_types()
+    clear_memo()
+
+    cmd = r'''python3 -c "import random; print(random.random())"'''
+    first = run(sh(cmd, memo=True) | to_str)
+    assert first == run(sh(cmd, memo=True) | to_str)
+    assert first == run([cmd] | execmd(memo=True) | to_str)
+    assert first != run(sh(cmd) | to_str)
+
+    cmd_upper = r'''python3 -c "import sys; sys.stdout.write(sys.stdin.read().upper())"'''
+    assert run(['abc'] | sh(cmd_upper, memo=True) | to_str) == 'ABC'
+    assert run(['def'] | sh(cmd_upper, memo=True) | to_str) == 'DEF'
+
+    clear_memo(cmd)
+    assert first != run(sh(cmd, memo=True) | to_str)
+
+    memo = LRUCache(maxsize=1)
+    first = run(sh(cmd, memo=memo) | to_str)
+    assert first == run(sh(cmd, memo=memo) | to_str)
+    run(['x'] | sh(cmd_upper, memo=memo) | to_str)
+    assert len(memo) == 1
+    assert first != run(sh(cmd, memo=memo) | to_str)
+
+    import threading
+    memo = LRUCache(maxsize=1000)
+    stop = threading.Event()
+
+    def fill():
+        i = 0
+        while not stop.is_set():
+            memo.put(('other', i), b'')
+            i += 1
+
+    filler = threading.Thread(target=fill)
+    filler.start()
+    try:
+        for i in range(200):
+            memo.put((cmd, i), b'')
+            clear_memo(cmd, memo)
+    finally:
+        stop.set()
+        filler.join()
+    assert memo.pop_if(lambda key: key[0] == cmd) == 0
+    assert memo.pop_if(lambda key: key[0] == 'other') > 0
+    assert len(memo) == 0